@@ -3,16 +3,35 @@ import json
 import re
 import smtplib
 import hashlib
-from datetime import datetime
+import mmap
+import queue
+import tempfile
+import time
+import zipfile
+import csv
+import codecs
+import itertools
+import secrets
+import heapq
+import unicodedata
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
 from io import BytesIO
+from contextlib import contextmanager
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 
-from flask import Flask, render_template, request, redirect, url_for, flash, make_response, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, make_response, send_file, jsonify, g, has_app_context, session
 from flask_sqlalchemy import SQLAlchemy
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
 
 # Config
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -38,8 +57,11 @@ except FileNotFoundError:
 app = Flask(__name__)
 # Use environment variable for secret key in production
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-me-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(BASE_DIR, 'hueppe.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(BASE_DIR, 'hueppe.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Strop pro celý request (hromadný import) a pro jeden importovaný soubor
+app.config['MAX_CONTENT_LENGTH'] = int(SETTINGS.get('max_request_mb', 200) * 1024 * 1024)
+IMPORT_MAX_FILE_BYTES = int(SETTINGS.get('max_import_file_mb', 50) * 1024 * 1024)
 
 db = SQLAlchemy(app)
 
@@ -66,6 +88,27 @@ class Order(db.Model):
     delivered = db.Column(db.Boolean, default=False)
     za_number = db.Column(db.String(50))  # ZA číslo (např. ZA-10250)
     oo_number = db.Column(db.String(50))  # OO číslo (např. OO-11056)
+    lane_strategy = db.Column(db.String(30))  # Strategie přiřazení lanes, None = výchozí ze settings
+    # Denormalizované souhrny palet - udržuje refresh_order_aggregates při každém commitu
+    pallet_count = db.Column(db.Integer, default=0)
+    lane_1_m = db.Column(db.Float, default=0.0)
+    lane_2_m = db.Column(db.Float, default=0.0)
+    lane_3_m = db.Column(db.Float, default=0.0)
+    total_weight = db.Column(db.Float, default=0.0)
+    loaded_count = db.Column(db.Integer, default=0)
+    lsa_count = db.Column(db.Integer, default=0)
+    # Verze zakázky - zvýší se při každém commitu, který mění zakázku nebo její palety (ETag)
+    version = db.Column(db.Integer, default=1, nullable=False)
+    # Náhodný token zakázky - SQLite po smazání / obnově zálohy používá stejná id znovu
+    cache_token = db.Column(db.String(16), default=lambda: secrets.token_hex(8))
+
+    __table_args__ = (
+        # Stránkování seznamů podle (created_at, id) v rámci aktivních / doručených zakázek
+        db.Index('ix_order_delivered_created', 'delivered', 'created_at', 'id'),
+        db.Index('ix_order_carrier_name', 'carrier_name'),
+        db.Index('ix_order_za_number', 'za_number'),
+        db.Index('ix_order_oo_number', 'oo_number'),
+    )
 
     def __repr__(self):
         return f'<Order {self.id} {self.name}>'
@@ -80,6 +123,78 @@ class ImportedFile(db.Model):
     
     order = db.relationship('Order', backref=db.backref('imported_files', lazy=True))
 
+class ImportJob(db.Model):
+    """Import Excelu běžící na pozadí (stav přežije restart aplikace)"""
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    file_hash = db.Column(db.String(64), nullable=False)
+    stored_path = db.Column(db.String(512))  # Uložená kopie uploadu pro worker
+    mode = db.Column(db.String(10), default='full')  # full = nový import, delta = revize existujících palet
+    profile = db.Column(db.String(50))  # Importní profil, None = výchozí Hüppe, 'auto' = detekce podle hlavičky
+    revises_file_id = db.Column(db.Integer, db.ForeignKey('imported_file.id'))  # Delta: revidovaný import, None = stejný název souboru
+    phase = db.Column(db.String(20), default='queued')  # queued, parsing, inserting, assigning, done, failed
+    claim_token = db.Column(db.String(16))  # Běh, který job právě zpracovává (po převzetí jiným během se původní ukončí)
+    rows_processed = db.Column(db.Integer, default=0)  # Zpracované řádky Excelu
+    pallets_imported = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    summary = db.Column(db.Text)  # JSON souhrn delta importu
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    order = db.relationship('Order', backref=db.backref('import_jobs', lazy=True))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'filename': self.filename,
+            'mode': self.mode or 'full',
+            'profile': self.profile,
+            'phase': self.phase,
+            'rows_processed': self.rows_processed or 0,
+            'pallets_imported': self.pallets_imported or 0,
+            'error': self.error,
+            'summary': json.loads(self.summary) if self.summary else None,
+            'finished': self.phase in IMPORT_JOB_FINISHED,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class ReoptimizeJob(db.Model):
+    """Hromadné přepočítání lanes otevřených zakázek na pozadí (report před/po po zakázkách)"""
+    id = db.Column(db.Integer, primary_key=True)
+    trigger = db.Column(db.String(20), default='manual')  # manual, settings
+    strategy = db.Column(db.String(30))  # None = strategie každé zakázky (resolve_lane_strategy)
+    capacity_m = db.Column(db.Float)  # Nová výchozí kapacita pro zakázky s původní výchozí (jen trigger settings)
+    previous_capacity_m = db.Column(db.Float)
+    phase = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    orders_total = db.Column(db.Integer, default=0)
+    orders_done = db.Column(db.Integer, default=0)
+    orders_changed = db.Column(db.Integer, default=0)
+    pallets_changed = db.Column(db.Integer, default=0)
+    report = db.Column(db.Text)  # JSON seznam zakázek s lanes před a po
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'trigger': self.trigger,
+            'strategy': self.strategy,
+            'phase': self.phase,
+            'orders_total': self.orders_total or 0,
+            'orders_done': self.orders_done or 0,
+            'orders_changed': self.orders_changed or 0,
+            'pallets_changed': self.pallets_changed or 0,
+            'report': json.loads(self.report) if self.report else [],
+            'error': self.error,
+            'finished': self.phase in IMPORT_JOB_FINISHED,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+
 # Nové modely pro centralizované LSA tabulky
 class PalletItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -94,9 +209,17 @@ class PalletItem(db.Model):
     assigned_lane = db.Column(db.Integer, default=0)  # 0=unassigned,1,2,3 lanes
     import_order = db.Column(db.Integer, default=0)  # Původní pořadí importu
     loaded = db.Column(db.Boolean, default=False)  # Označení skutečně naložených palet
+    revision_removed = db.Column(db.Boolean, default=False)  # Chybí v revidovaném souboru dodavatele (delta import)
+    imported_file_id = db.Column(db.Integer, db.ForeignKey('imported_file.id'))  # Import, ze kterého paleta pochází
 
     order = db.relationship('Order', backref=db.backref('items', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_pallet_item_order_id', 'order_id'),
+        db.Index('ix_pallet_item_imported_file', 'imported_file_id'),  # Palety jednoho importu pro delta import
+        db.Index('ix_pallet_item_lsa_order', 'lsa', 'order_id'),  # Filtr seznamů zakázek podle LSA
+    )
+
     def __repr__(self):
         return f'<Pallet {self.id} LSA:{self.lsa} len:{self.length_m} m lane:{self.assigned_lane}>'
 
@@ -127,6 +250,194 @@ def init_db():
                 print("Added 'loaded' column to PalletItem table")
     except Exception as e:
         print(f"Migration note for PalletItem: {e}")
+    
+    # Migrace pro delta import (revize souborů dodavatele)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(db.text("PRAGMA table_info(pallet_item)"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'revision_removed' not in columns:
+                conn.execute(db.text("ALTER TABLE pallet_item ADD COLUMN revision_removed BOOLEAN DEFAULT 0"))
+                print("Added 'revision_removed' column to PalletItem table")
+            if 'imported_file_id' not in columns:
+                conn.execute(db.text("ALTER TABLE pallet_item ADD COLUMN imported_file_id INTEGER REFERENCES imported_file(id)"))
+                print("Added 'imported_file_id' column to PalletItem table")
+            
+            result = conn.execute(db.text("PRAGMA table_info(import_job)"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'mode' not in columns:
+                conn.execute(db.text("ALTER TABLE import_job ADD COLUMN mode VARCHAR(10) DEFAULT 'full'"))
+                print("Added 'mode' column to ImportJob table")
+            if 'summary' not in columns:
+                conn.execute(db.text("ALTER TABLE import_job ADD COLUMN summary TEXT"))
+                print("Added 'summary' column to ImportJob table")
+            if 'profile' not in columns:
+                conn.execute(db.text("ALTER TABLE import_job ADD COLUMN profile VARCHAR(50)"))
+                print("Added 'profile' column to ImportJob table")
+            if 'revises_file_id' not in columns:
+                conn.execute(db.text("ALTER TABLE import_job ADD COLUMN revises_file_id INTEGER REFERENCES imported_file(id)"))
+                print("Added 'revises_file_id' column to ImportJob table")
+            if 'claim_token' not in columns:
+                conn.execute(db.text("ALTER TABLE import_job ADD COLUMN claim_token VARCHAR(16)"))
+                print("Added 'claim_token' column to ImportJob table")
+    except Exception as e:
+        print(f"Migration note for delta import: {e}")
+    
+    # Migrace pro volbu strategie lanes po zakázkách
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(db.text("PRAGMA table_info([order])"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'lane_strategy' not in columns:
+                conn.execute(db.text("ALTER TABLE [order] ADD COLUMN lane_strategy VARCHAR(30)"))
+                print("Added 'lane_strategy' column to Order table")
+    except Exception as e:
+        print(f"Migration note for lane strategy: {e}")
+    
+    # Migrace pro verzi zakázky (ETag pohledů zakázky)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(db.text("PRAGMA table_info([order])"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'version' not in columns:
+                conn.execute(db.text("ALTER TABLE [order] ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+                print("Added 'version' column to Order table")
+    except Exception as e:
+        print(f"Migration note for order version: {e}")
+    
+    # Migrace pro token zakázky (ETag a cache vykreslených pohledů)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(db.text("PRAGMA table_info([order])"))
+            columns = [row[1] for row in result.fetchall()]
+            if 'cache_token' not in columns:
+                conn.execute(db.text("ALTER TABLE [order] ADD COLUMN cache_token VARCHAR(16)"))
+                print("Added 'cache_token' column to Order table")
+            conn.execute(db.text("UPDATE [order] SET cache_token = lower(hex(randomblob(8))) WHERE cache_token IS NULL"))
+    except Exception as e:
+        print(f"Migration note for order cache token: {e}")
+    
+    # Migrace pro denormalizované souhrny zakázek (po přidání se jednou dopočítají)
+    try:
+        with db.engine.begin() as conn:
+            result = conn.execute(db.text("PRAGMA table_info([order])"))
+            columns = [row[1] for row in result.fetchall()]
+            added = False
+            for name, ddl in ORDER_AGGREGATE_DDL.items():
+                if name not in columns:
+                    conn.execute(db.text(f"ALTER TABLE [order] ADD COLUMN {name} {ddl}"))
+                    added = True
+            if added:
+                print("Added aggregate columns to Order table")
+        if added:
+            print(f"Rebuilt aggregates for {rebuild_order_aggregates()} orders")
+    except Exception as e:
+        print(f"Migration note for order aggregates: {e}")
+    
+    # Migrace pro indexy seznamů zakázek (create_all je u existujících tabulek nevytvoří)
+    try:
+        with db.engine.begin() as conn:
+            for table in (Order.__table__, PalletItem.__table__):
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+    except Exception as e:
+        print(f"Migration note for order list indexes: {e}")
+
+# Souhrny palet na Order - přepočítají se v rámci commitu pro každou zakázku,
+# jejíž palety nebo údaje se změnily, a zároveň se jí zvýší version (ORM změny
+# se poznají samy, hromadné Core zápisy volají mark_order_aggregates)
+ORDER_AGGREGATE_DDL = {
+    'pallet_count': 'INTEGER DEFAULT 0',
+    'lane_1_m': 'FLOAT DEFAULT 0.0',
+    'lane_2_m': 'FLOAT DEFAULT 0.0',
+    'lane_3_m': 'FLOAT DEFAULT 0.0',
+    'total_weight': 'FLOAT DEFAULT 0.0',
+    'loaded_count': 'INTEGER DEFAULT 0',
+    'lsa_count': 'INTEGER DEFAULT 0',
+}
+ORDER_AGGREGATE_CHUNK = 500
+
+def mark_order_aggregates(order_ids):
+    """Zařadí zakázky k přepočtu souhrnů a zvýšení verze při příštím commitu session"""
+    db.session.info.setdefault('aggregate_orders', set()).update(
+        order_id for order_id in order_ids if order_id is not None
+    )
+
+def refresh_order_aggregates(order_ids, session=None):
+    """Přepočítá souhrny palet zadaných zakázek a zvýší jim version (bez commitu)"""
+    session = session or db.session
+    table = PalletItem.__table__
+    orders = Order.__table__
+    order_ids = sorted(set(order_ids))
+    
+    def lane_sum(lane):
+        return db.func.coalesce(db.func.sum(db.case((table.c.assigned_lane == lane, table.c.length_m), else_=0.0)), 0.0)
+    
+    update_stmt = orders.update().where(orders.c.id == db.bindparam('b_id')).values(
+        pallet_count=db.bindparam('b_pallet_count'),
+        lane_1_m=db.bindparam('b_lane_1_m'),
+        lane_2_m=db.bindparam('b_lane_2_m'),
+        lane_3_m=db.bindparam('b_lane_3_m'),
+        total_weight=db.bindparam('b_total_weight'),
+        loaded_count=db.bindparam('b_loaded_count'),
+        lsa_count=db.bindparam('b_lsa_count'),
+        version=db.func.coalesce(orders.c.version, 0) + 1,
+    )
+    for i in range(0, len(order_ids), ORDER_AGGREGATE_CHUNK):
+        chunk = order_ids[i:i + ORDER_AGGREGATE_CHUNK]
+        rows = session.execute(
+            db.select(
+                table.c.order_id,
+                db.func.count(table.c.id),
+                lane_sum(1), lane_sum(2), lane_sum(3),
+                db.func.coalesce(db.func.sum(table.c.weight), 0.0),
+                db.func.coalesce(db.func.sum(db.case((table.c.loaded == True, 1), else_=0)), 0),
+                db.func.count(db.distinct(table.c.lsa)),
+            )
+            .where(table.c.order_id.in_(chunk))
+            .group_by(table.c.order_id)
+        ).all()
+        values = {order_id: (0, 0.0, 0.0, 0.0, 0.0, 0, 0) for order_id in chunk}
+        for order_id, *aggregates in rows:
+            values[order_id] = aggregates
+        session.execute(update_stmt, [
+            {
+                'b_id': order_id, 'b_pallet_count': count,
+                'b_lane_1_m': round(lane_1, 3), 'b_lane_2_m': round(lane_2, 3), 'b_lane_3_m': round(lane_3, 3),
+                'b_total_weight': round(weight, 3), 'b_loaded_count': loaded, 'b_lsa_count': lsa_count,
+            }
+            for order_id, (count, lane_1, lane_2, lane_3, weight, loaded, lsa_count) in values.items()
+        ])
+
+def rebuild_order_aggregates():
+    """Přepočítá souhrny všech zakázek a commitne. Vrací počet zakázek."""
+    order_ids = [order_id for (order_id,) in db.session.execute(db.select(Order.__table__.c.id)).all()]
+    refresh_order_aggregates(order_ids)
+    db.session.commit()
+    return len(order_ids)
+
+@db.event.listens_for(db.session, 'before_flush')
+def _track_order_aggregates_on_flush(session, flush_context, instances):
+    changed = session.info.setdefault('aggregate_orders', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Order) and obj.id is not None and session.is_modified(obj, include_collections=False):
+            changed.add(obj.id)
+        elif isinstance(obj, PalletItem):
+            changed.add(obj.order_id)
+            # Paleta přesunutá z jiné zakázky
+            changed.update(db.inspect(obj).attrs.order_id.history.deleted or ())
+
+@db.event.listens_for(db.session, 'before_commit')
+def _refresh_order_aggregates_on_commit(session):
+    session.flush()
+    order_ids = session.info.pop('aggregate_orders', None)
+    order_ids = {order_id for order_id in order_ids or () if order_id is not None}
+    if order_ids:
+        refresh_order_aggregates(order_ids, session)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _discard_order_aggregates(session):
+    session.info.pop('aggregate_orders', None)
 
 def get_lsa_color(lsa_code):
     """Vrátí konzistentní barvu pro LSA kód"""
@@ -156,94 +467,1384 @@ def from_json_filter(value):
     except:
         return []
 
-def parse_length_from_text(text):
+class TTLCache:
+    """LRU cache s volitelnou expirací a limitem celkové velikosti (thread-safe).
+
+    Velikost položky určuje `sizeof(value)` (výchozí 1 = limit počtu položek).
+    """
+
+    def __init__(self, max_entries=128, ttl_seconds=None, max_size=None, sizeof=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._sizeof = sizeof
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value):
+        size = self._sizeof(value) if self._sizeof else 1
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, size, value)
+            self._size += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            expires_at, _, value = self._data[key]
+            self._remove(key)
+            if expires_at is not None and expires_at < time.monotonic():
+                return default
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'size': self._size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._size -= size
+
+    def _evict(self):
+        # Nejdřív expirované, pak nejdéle nepoužité položky
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _, _) in self._data.items() if expires_at is not None and expires_at < now]:
+            self._remove(key)
+        while self._data and (len(self._data) > self.max_entries or (self.max_size and self._size > self.max_size)):
+            self._remove(next(iter(self._data)))
+
+def compute_pallet_price(lane_totals, price_per_place, full_truck_price):
+    """Paletová místa a cena z délek lanes - vrací (pallet_places, price, is_full)"""
+    sum_cols = sum(lane_totals)
+    pallet_places = round((sum_cols / 3.0) / 0.4, 2) if sum_cols > 0 else 0.0
+    price = round(pallet_places * price_per_place, 2)
+    is_full = price >= full_truck_price
+    if is_full:
+        price = full_truck_price
+    return pallet_places, price, is_full
+
+# Délka z textu palety - předkompilované vzory, texty se v souborech hodně opakují
+LENGTH_DIMENSIONS_RE = re.compile(r"(\d{2,3})\s*[xX]\s*(\d{2,3})")
+LENGTH_FALLBACK_RE = re.compile(r"(\d{3})")
+LENGTH_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=LENGTH_CACHE_SIZE)
+def _parse_length_cached(text):
     # Expect formats like '80x230' or 'Standard EWP 80x130' -> extract second number
     # 80x230 means 230cm length = 2.30m
-    if not isinstance(text, str):
-        return 0.0
-    m = re.search(r"(\d{2,3})\s*[xX]\s*(\d{2,3})", text)
+    m = LENGTH_DIMENSIONS_RE.search(text)
     if m:
         # first group width (80), second group length (e.g., 230)
-        width = int(m.group(1))
         length = int(m.group(2))
         # convert length cm to meters
         return round(length / 100.0, 3)
     # fallback: try to find a three-digit number
-    m2 = re.search(r"(\d{3})", text)
+    m2 = LENGTH_FALLBACK_RE.search(text)
     if m2:
         length = int(m2.group(1))
         return round(length / 100.0, 3)
     return 0.0
 
-def auto_assign_lanes(order_id):
-    """Automatically assign pallets to lanes using round-robin with LSA grouping"""
-    order = Order.query.get_or_404(order_id)
-    all_items = PalletItem.query.filter_by(order_id=order.id).order_by(PalletItem.import_order).all()
+def parse_length_from_text(text):
+    if not isinstance(text, str):
+        return 0.0
+    return _parse_length_cached(text)
+
+def parse_lengths_from_texts(texts, stats=None):
+    """Dávkově určí délky pro celý sloupec textů - každý unikátní text jen jednou.
+
+    Do `stats` (pokud je zadán) přičte počet textů a unikátních textů tohoto
+    volání - počítadla jsou lokální, souběžné importy v jiných threadech je
+    neovlivní (globální cache_info() LRU cache sdílí celý proces).
+    """
+    resolved = {text: parse_length_from_text(text) for text in dict.fromkeys(texts)}
+    lengths = np.fromiter((resolved[text] for text in texts), dtype=np.float64, count=len(texts))
+    if stats is not None:
+        stats['texts'] = stats.get('texts', 0) + len(texts)
+        stats['unique_texts'] = stats.get('unique_texts', 0) + len(resolved)
+    return lengths
+
+def _cell_text(value):
+    return str(value).strip() if value is not None else ''
+
+def _cell_length(value):
+    # Délka ze sloupců G/H/I - bereme jen čistě číselné hodnoty
+    if value is not None and str(value).replace('.', '').replace(',', '').isdigit():
+        return float(value)
+    return 0.0
+
+def parse_pallet_row(row):
+    """Převede surový řádek A-I na slovník palety, None pokud řádek nejde zpracovat"""
+    try:
+        qty = int(row[4]) if row[4] is not None else 1                # Sloupec E
+        weight = float(row[5]) if row[5] is not None else 0.0         # Sloupec F
+        pallet_text = _cell_text(row[3])                              # Sloupec D
+
+        # Skutečné délky ze sloupců G, H, I - první nenulová, jinak parsování z textu
+        length_m = 0.0
+        for value in row[6:9]:
+            length_m = _cell_length(value)
+            if length_m > 0:
+                break
+        else:
+            length_m = parse_length_from_text(pallet_text)
+    except (TypeError, ValueError):
+        return None
+
+    return {
+        'date_received': _cell_text(row[0]),    # Sloupec A - datum
+        'lsa_designation': _cell_text(row[1]),  # Sloupec B
+        'lsa': _cell_text(row[2]),              # Sloupec C
+        'pallet_text': pallet_text,
+        'qty': qty,
+        'weight': weight,
+        'length_m': length_m,
+    }
+
+def iter_pallet_rows(file_obj):
+    """Líně vrací zparsované řádky palet z Excelu (nevalidní řádky přeskočí)"""
+    for row in iter_excel_rows(file_obj):
+        parsed = parse_pallet_row(row)
+        if parsed is not None:
+            yield parsed
+
+# Importní profily - mapování rozložení souborů dodavatelů na pole PalletItem.
+# Parsery pracují s kanonickým řádkem A-I, profil určuje, odkud se jednotlivá pole berou.
+IMPORT_FIELDS = (
+    'date_received',    # A
+    'lsa_designation',  # B
+    'lsa',              # C
+    'pallet_text',      # D
+    'qty',              # E
+    'weight',           # F - celková váha řádku
+    'length_m',         # G - délky G/H/I, použije se první nenulová
+    'length_m_2',       # H
+    'length_m_3',       # I
+)
+IMPORT_NUMERIC_FIELDS = ('qty', 'weight', 'length_m', 'length_m_2', 'length_m_3')
+IMPORT_FIRST_ROW = 3
+IMPORT_COLUMNS = len(IMPORT_FIELDS)
+IMPORT_HEADER_SCAN_ROWS = 20  # Kolik úvodních řádků se prohledá při hledání hlavičky
+IMPORT_CSV_EXTENSIONS = ('.csv', '.tsv', '.txt')
+IMPORT_EXTENSIONS = ('.xlsx',) + IMPORT_CSV_EXTENSIONS
+IMPORT_DEFAULT_PROFILE = 'hueppe'
+IMPORT_AUTO_PROFILE = 'auto'  # Profil podle nalezené hlavičky - jen na výslovnou volbu
+
+# Profil je buď poziční (`columns` + `first_row`), nebo podle hlavičky (`header` = pole -> možné názvy sloupců).
+# Další profily lze doplnit v settings.json pod klíčem "import_profiles".
+IMPORT_PROFILES = {
+    'hueppe': {
+        'label': 'Hüppe - Excel, data A-I od řádku 3',
+        'first_row': IMPORT_FIRST_ROW,
+        'columns': list(range(IMPORT_COLUMNS)),
+    },
+    'supplier_export': {
+        'label': 'Export dodavatele - hlavička Datum_doruceni, Oznaceni, LSA, Delka_m...',
+        'header': {
+            'date_received': ['Datum_doruceni', 'Datum doručení', 'Datum'],
+            'lsa_designation': ['Oznaceni', 'Označení'],
+            'lsa': ['LSA'],
+            'pallet_text': ['Nazev', 'Název', 'Text', 'Popis'],
+            'qty': ['Pocet', 'Počet', 'Ks', 'Qty'],
+            'weight': ['Vaha_kg', 'Váha kg', 'Vaha', 'Váha'],
+            'length_m': ['Delka_m', 'Délka m', 'Delka', 'Délka'],
+        },
+        'required': ['lsa', 'length_m'],
+    },
+}
+
+def get_import_profiles():
+    """Vestavěné profily doplněné/přepsané profily ze settings.json"""
+    profiles = dict(IMPORT_PROFILES)
+    profiles.update(SETTINGS.get('import_profiles', {}))
+    return profiles
+
+def is_known_import_profile(name):
+    """Prázdná volba (výchozí profil), automatická detekce nebo existující profil"""
+    return not name or name == IMPORT_AUTO_PROFILE or name in get_import_profiles()
+
+def _normalize_header(value):
+    # Porovnání hlaviček bez ohledu na velikost písmen, diakritiku a oddělovače
+    text = unicodedata.normalize('NFKD', _cell_text(value)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[\s\-.]+', '_', text.lower()).strip('_')
+
+def _match_header(row, profile):
+    """Indexy sloupců pro IMPORT_FIELDS, pokud řádek je hlavičkou profilu, jinak None"""
+    positions = {}
+    for index, value in enumerate(row):
+        positions.setdefault(_normalize_header(value), index)
+    indexes = []
+    for field in IMPORT_FIELDS:
+        names = profile['header'].get(field, [])
+        indexes.append(next((positions[_normalize_header(name)] for name in names if _normalize_header(name) in positions), None))
+    required = profile.get('required') or list(profile['header'])
+    if any(indexes[IMPORT_FIELDS.index(field)] is None for field in required):
+        return None
+    return indexes
+
+def detect_import_layout(head, profile_name=None):
+    """Určí profil a mapování sloupců z úvodních řádků souboru.
+
+    Bez zadaného profilu se použije výchozí poziční profil Hüppe. Profil
+    IMPORT_AUTO_PROFILE zkusí všechny profily s hlavičkou a pokud žádná
+    hlavička nesedí, použije výchozí profil. Vrací
+    (název_profilu, indexy_sloupců, index_prvního_datového_řádku).
+    """
+    profiles = get_import_profiles()
+    auto = profile_name == IMPORT_AUTO_PROFILE
+    if auto:
+        profile_name = None
+        candidates = [name for name in profiles if 'header' in profiles[name]]
+    elif profile_name and profile_name not in profiles:
+        raise ValueError(f'Neznámý importní profil "{profile_name}"')
+    else:
+        candidates = [profile_name] if profile_name else []
+    for name in candidates:
+        profile = profiles[name]
+        if 'header' not in profile:
+            continue
+        for row_number, row in enumerate(head):
+            indexes = _match_header(row, profile)
+            if indexes is not None:
+                return name, indexes, row_number + 1
+        if profile_name:
+            raise ValueError(f'V souboru nebyla nalezena hlavička profilu "{profile.get("label", name)}"')
     
-    if not all_items:
-        return
+    name = profile_name or IMPORT_DEFAULT_PROFILE
+    profile = profiles[name]
+    columns = list(profile.get('columns', range(IMPORT_COLUMNS)))
+    columns += [None] * (IMPORT_COLUMNS - len(columns))
+    return name, columns, profile.get('first_row', 1) - 1
+
+def _text_number(value):
+    # "1.234,5" / "1 234,5" -> "1234.5": s desetinnou čárkou jsou tečky a mezery oddělovače tisíců
+    value = value.strip()
+    if ',' in value:
+        value = re.sub(r'[.\s\u00a0]', '', value).replace(',', '.')
+    return value
+
+def map_import_rows(raw_rows, profile_name=None, text_cells=False):
+    """Převede surové řádky souboru na kanonické řádky A-I podle profilu (streamovaně).
+
+    `text_cells` - hodnoty jsou řetězce (CSV): prázdné buňky -> None,
+    v číselných polích se odstraní oddělovače tisíců a desetinná čárka se
+    nahradí tečkou.
+    """
+    raw_rows = iter(raw_rows)
+    head = list(itertools.islice(raw_rows, IMPORT_HEADER_SCAN_ROWS))
+    _, indexes, data_start = detect_import_layout(head, profile_name)
+    numeric = [field in IMPORT_NUMERIC_FIELDS for field in IMPORT_FIELDS]
+    identity = indexes == list(range(IMPORT_COLUMNS))  # Rozložení A-I (Hüppe) - jen ořez/doplnění
+    
+    for raw in itertools.chain(head[data_start:], raw_rows):
+        width = len(raw)
+        if identity:
+            row = raw if width == IMPORT_COLUMNS else tuple(raw[:IMPORT_COLUMNS]) + (None,) * (IMPORT_COLUMNS - width)
+        else:
+            row = tuple(raw[i] if i is not None and i < width else None for i in indexes)
+        if text_cells:
+            row = tuple(
+                None if not value or not value.strip() else (_text_number(value) if is_numeric else value)
+                for value, is_numeric in zip(row, numeric)
+            )
+        # Prázdné řádky (např. oddělovače mezi bloky) přeskočíme
+        if all(value is None or (isinstance(value, str) and not value.strip()) for value in row):
+            continue
+        yield row
+
+def iter_sheet_rows(file_obj):
+    """Streamuje všechny řádky prvního listu Excelu (openpyxl read-only, bez DataFrame)"""
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def iter_excel_rows(file_obj, profile_name=IMPORT_DEFAULT_PROFILE):
+    """Kanonické řádky A-I z Excelu (výchozí profil Hüppe: data od řádku 3)"""
+    return map_import_rows(iter_sheet_rows(file_obj), profile_name)
+
+def _detect_csv_encoding(sample):
+    # Exporty z českého Excelu bývají ve Windows-1250, ostatní v UTF-8
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1250'
+
+def iter_csv_rows(path, filename=None, profile_name=None):
+    """Kanonické řádky A-I z CSV/TSV - stdlib csv, soubor se čte streamovaně.
+
+    Kódování i oddělovač se odhadnou z úvodní části souboru.
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(64 * 1024)
+    encoding = _detect_csv_encoding(sample)
+    sample_text = sample.decode(encoding, errors='ignore')
+    try:
+        delimiter = csv.Sniffer().sniff(sample_text, delimiters=',;\t|').delimiter
+    except csv.Error:
+        delimiter = '\t' if (filename or path).lower().endswith('.tsv') else ','
+    
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        yield from map_import_rows(csv.reader(f, delimiter=delimiter), profile_name, text_cells=True)
+
+def is_csv_upload(filename):
+    return (filename or '').lower().endswith(IMPORT_CSV_EXTENSIONS)
+
+def read_import_rows(path, filename, profile_name=None):
+    """Kanonické řádky A-I z uloženého uploadu - podle přípony CSV/TSV nebo Excel"""
+    if is_csv_upload(filename):
+        yield from iter_csv_rows(path, filename, profile_name)
+    else:
+        with open_spooled(path) as f:
+            yield from map_import_rows(iter_sheet_rows(f), profile_name)
+
+def _to_numeric(column):
+    """Vektorově převede sloupec na float64 - vrací (hodnoty, maska_nevalidních)"""
+    raw = pd.Series(column, dtype=object)
+    values = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=np.float64)
+    invalid = np.isnan(values) & raw.notna().to_numpy()
+    return values, invalid
+
+class PalletBatch:
+    """Sloupcová dávka palet po rozbalení podle qty, připravená pro hromadný insert.
+
+    Texty se drží jen jednou za zdrojový řádek, rozbalené palety na ně
+    odkazují přes `row_index`.
+    """
+
+    def __init__(self, date_received, lsa_designation, lsa, pallet_text, row_index, weight, length_m, source_rows, length_stats=None):
+        self.date_received = date_received
+        self.lsa_designation = lsa_designation
+        self.lsa = lsa
+        self.pallet_text = pallet_text
+        self.row_index = row_index
+        self.weight = weight
+        self.length_m = length_m
+        self.source_rows = source_rows
+        # Statistika dopočtu délek z textu (parse_lengths_from_texts)
+        self.length_stats = length_stats or {}
+
+    def __len__(self):
+        return len(self.row_index)
+
+    @classmethod
+    def concat(cls, parts):
+        """Spojí dávky z jednotlivých bloků do jedné"""
+        date_received, lsa_designation, lsa, pallet_text, row_index = [], [], [], [], []
+        length_stats = {}
+        offset = 0
+        for part in parts:
+            for key, value in part.length_stats.items():
+                length_stats[key] = length_stats.get(key, 0) + value
+            date_received.extend(part.date_received)
+            lsa_designation.extend(part.lsa_designation)
+            lsa.extend(part.lsa)
+            pallet_text.extend(part.pallet_text)
+            row_index.append(part.row_index + offset)
+            offset += len(part.pallet_text)
+        return cls(
+            date_received, lsa_designation, lsa, pallet_text,
+            np.concatenate(row_index) if row_index else np.empty(0, dtype=np.int64),
+            np.concatenate([part.weight for part in parts]) if parts else np.empty(0),
+            np.concatenate([part.length_m for part in parts]) if parts else np.empty(0),
+            sum(part.source_rows for part in parts),
+            length_stats,
+        )
+
+    def iter_records(self, order_id, start_import_order=1, imported_file_id=None):
+        """Vrací slovníky sloupců PalletItem (jedna paleta = jeden záznam)"""
+        for pos, (src, weight, length_m) in enumerate(zip(self.row_index.tolist(), self.weight.tolist(), self.length_m.tolist())):
+            yield {
+                'order_id': order_id,
+                'date_received': self.date_received[src],
+                'lsa_designation': self.lsa_designation[src],
+                'lsa': self.lsa[src],
+                'pallet_text': self.pallet_text[src],
+                'qty': 1,
+                'weight': weight,
+                'length_m': length_m,
+                'assigned_lane': 0,
+                'import_order': start_import_order + pos,
+                'loaded': False,
+                'revision_removed': False,
+                'imported_file_id': imported_file_id,
+            }
+
+# Počet řádků zpracovaných najednou - drží paměť i práci GC v mezích
+IMPORT_CHUNK_ROWS = 5000
+# Nejvyšší přípustný počet palet na jednom řádku - větší qty je chyba v souboru
+IMPORT_MAX_QTY = int(SETTINGS.get('max_import_qty', 1000))
+
+def coerce_rows(rows, first_row=1):
+    """Sloupcový převod bloku surových řádků A-I - jeden záznam na platný zdrojový řádek.
+
+    `first_row` je pořadí prvního řádku bloku mezi datovými řádky souboru
+    (pro chybové hlášení). Nekonečné nebo příliš velké qty vyhodí ValueError.
+    """
+    columns = list(zip(*rows))
+    qty, qty_invalid = _to_numeric(columns[4])              # Sloupec E
+    weight, weight_invalid = _to_numeric(columns[5])        # Sloupec F
+    lengths = [np.nan_to_num(_to_numeric(columns[c])[0]) for c in (6, 7, 8)]  # Sloupce G, H, I
+
+    # Řádky s nečíselným qty/váhou se přeskakují (stejně jako dřív)
+    keep = np.flatnonzero(~(qty_invalid | weight_invalid))
+
+    pallet_text = [_cell_text(columns[3][i]) for i in keep]
+    # První nenulová délka G -> H -> I, jinak parsování z textu
+    length_m = np.select([lengths[0] > 0, lengths[1] > 0, lengths[2] > 0], lengths, default=np.nan)[keep]
+    fallback = np.flatnonzero(np.isnan(length_m))
+    length_stats = {}
+    if len(fallback):
+        length_m[fallback] = parse_lengths_from_texts([pallet_text[i] for i in fallback], length_stats)
+
+    qty = np.where(np.isnan(qty[keep]), 1, qty[keep])
+    too_large = np.flatnonzero(~(qty <= IMPORT_MAX_QTY))  # Zachytí i inf
+    if len(too_large):
+        bad = too_large[0]
+        raise ValueError(
+            f'Neplatný počet palet "{columns[4][keep[bad]]}" na {first_row + keep[bad]}. datovém řádku '
+            f'(nejvýše {IMPORT_MAX_QTY})'
+        )
+    qty = qty.astype(np.int64)
+    return {
+        'date_received': [_cell_text(columns[0][i]) for i in keep],
+        'lsa_designation': [_cell_text(columns[1][i]) for i in keep],
+        'lsa': [_cell_text(columns[2][i]) for i in keep],
+        'pallet_text': pallet_text,
+        'qty': np.maximum(qty, 1),
+        'weight': np.nan_to_num(weight[keep]),
+        'length_m': length_m,
+        'source_rows': len(rows),
+        'length_stats': length_stats,
+    }
+
+def expand_by_qty(coerced):
+    """Rozbalí převedené řádky podle qty (np.repeat) na dávku jednotlivých palet"""
+    qty = coerced['qty']
+    row_index = np.repeat(np.arange(len(qty)), qty)
+    return PalletBatch(
+        date_received=coerced['date_received'],
+        lsa_designation=coerced['lsa_designation'],
+        lsa=coerced['lsa'],
+        pallet_text=coerced['pallet_text'],
+        row_index=row_index,
+        weight=(coerced['weight'] / qty)[row_index],
+        length_m=coerced['length_m'][row_index],
+        source_rows=coerced['source_rows'],
+        length_stats=coerced['length_stats'],
+    )
+
+def _build_batch_chunk(rows, first_row):
+    return expand_by_qty(coerce_rows(rows, first_row))
+
+def build_pallet_batch(raw_rows, progress=None):
+    """Zpracuje surové řádky A-I sloupcově (po blocích) a rozbalí je podle qty.
+
+    `progress(rows_done)` se volá po každém zpracovaném bloku.
+    """
+    parts = []
+    chunk = []
+    rows_done = 0
+    for row in raw_rows:
+        chunk.append(row)
+        if len(chunk) >= IMPORT_CHUNK_ROWS:
+            parts.append(_build_batch_chunk(chunk, rows_done + 1))
+            rows_done += len(chunk)
+            chunk = []
+            if progress:
+                progress(rows_done)
+    if chunk:
+        parts.append(_build_batch_chunk(chunk, rows_done + 1))
+        rows_done += len(chunk)
+        if progress:
+            progress(rows_done)
+    return PalletBatch.concat(parts)
+
+# Velikost bloku pro executemany při hromadném zápisu palet
+BULK_INSERT_CHUNK = 1000
+
+def next_import_order(order_id):
+    """Vrátí další volné import_order v zakázce (navazuje na poslední paletu)"""
+    max_import_order = db.session.query(db.func.max(PalletItem.import_order)).filter_by(order_id=order_id).scalar()
+    return (max_import_order or 0) + 1
+
+def bulk_insert_pallets(order_id, batch, imported_file_id=None, chunk_size=BULK_INSERT_CHUNK):
+    """Hromadně vloží dávku palet přes Core insert() (executemany po blocích).
+
+    import_order navazuje souvisle na existující palety zakázky, palety se
+    označí id záznamu ImportedFile. Commit nechává na volajícím, aby import
+    a záznam ImportedFile byly v jedné transakci. Vrací počet vložených řádků.
+    """
+    insert_stmt = PalletItem.__table__.insert()
+    mark_order_aggregates([order_id])
+    inserted = 0
+    chunk = []
+    for record in batch.iter_records(order_id, next_import_order(order_id), imported_file_id):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            db.session.execute(insert_stmt, chunk)
+            inserted += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert_stmt, chunk)
+        inserted += len(chunk)
+    return inserted
+
+def pallet_fingerprint(date_received, lsa_designation, lsa, pallet_text, length_m):
+    """Klíč řádku pro delta import - délka zaokrouhlená na centimetry"""
+    return (date_received or '', lsa_designation or '', lsa or '', pallet_text or '', round(length_m or 0.0, 2))
+
+def delta_import_pallets(order_id, batch, previous_file_id, imported_file_id):
+    """Porovná revidovaný soubor s paletami předchozího importu téhož souboru a zapíše jen rozdíly.
+
+    Porovnávají se jen palety zakázky z importu `previous_file_id` - palety
+    z jiných souborů nebo přesunuté z jiných zakázek se nemění. Řádky se
+    párují podle otisku (datum, označení, LSA, text, délka); počet a váha
+    jsou porovnávaná data. Nové palety se vloží, přebývající se označí jako
+    revision_removed, změněná váha se přepíše. Stávající palety si ponechají
+    svou lane, nové palety LSA, které už v zakázce je, jdou do lane této LSA
+    a jen nové skupiny LSA jdou celé do nejméně zatížené lane. Všechny palety
+    předchozího importu pak patří k revizi `imported_file_id` (další revize
+    navazuje na ni). Commit nechává na volajícím. Vrací souhrn počtů palet.
+    """
+    mark_order_aggregates([order_id])
+    # Souhrn souboru po zdrojových řádcích (qty a celková váha) - řádky se stejným otiskem sečteme
+    qty_per_row = np.bincount(batch.row_index, minlength=len(batch.pallet_text))
+    weight_per_row = np.bincount(batch.row_index, weights=batch.weight, minlength=len(batch.pallet_text))
+    first_pos = np.searchsorted(batch.row_index, np.arange(len(batch.pallet_text)))
+    file_rows = OrderedDict()
+    for src, (qty, weight) in enumerate(zip(qty_per_row.tolist(), weight_per_row.tolist())):
+        key = pallet_fingerprint(batch.date_received[src], batch.lsa_designation[src], batch.lsa[src],
+                                 batch.pallet_text[src], float(batch.length_m[first_pos[src]]))
+        entry = file_rows.setdefault(key, [0, 0.0])
+        entry[0] += qty
+        entry[1] += weight
+    
+    # Index palet předchozího importu podle otisku (v pořadí importu)
+    table = PalletItem.__table__
+    in_previous_import = db.and_(table.c.order_id == order_id, table.c.imported_file_id == previous_file_id)
+    existing = db.session.execute(
+        db.select(table.c.id, table.c.date_received, table.c.lsa_designation, table.c.lsa, table.c.pallet_text,
+                  table.c.length_m, table.c.weight, table.c.revision_removed)
+        .where(in_previous_import)
+        .order_by(table.c.import_order)
+    ).all()
+    index = {}
+    for row in existing:
+        key = pallet_fingerprint(row.date_received, row.lsa_designation, row.lsa, row.pallet_text, row.length_m)
+        index.setdefault(key, []).append(row)
+    
+    # Zatížení lanes a lanes LSA podle všech aktivních palet zakázky
+    lane_totals = [0.0, 0.0, 0.0]
+    lsa_lane_counts = {}  # LSA -> počty palet po lanes
+    for lsa, lane, count, length_m in db.session.execute(
+        db.select(table.c.lsa, table.c.assigned_lane, db.func.count(), db.func.sum(table.c.length_m))
+        .where(table.c.order_id == order_id, table.c.assigned_lane.in_((1, 2, 3)),
+               db.func.coalesce(table.c.revision_removed, False) == False)
+        .group_by(table.c.lsa, table.c.assigned_lane)
+    ).all():
+        lane_totals[lane - 1] += length_m or 0.0
+        lsa_lane_counts.setdefault(lsa, [0, 0, 0])[lane - 1] += count
+    
+    updates = []   # (id, weight, revision_removed)
+    new_records = []
+    summary = {'inserted': 0, 'removed': 0, 'updated': 0, 'unchanged': 0}
+    for key, (qty, total_weight) in file_rows.items():
+        old_rows = index.pop(key, [])
+        weight = total_weight / qty
+        for row in old_rows[:qty]:
+            if row.revision_removed or abs((row.weight or 0.0) - weight) > 1e-6:
+                updates.append({'b_id': row.id, 'b_weight': weight, 'b_removed': False})
+                summary['updated'] += 1
+            else:
+                summary['unchanged'] += 1
+        for row in old_rows[qty:]:
+            if not row.revision_removed:
+                updates.append({'b_id': row.id, 'b_weight': row.weight, 'b_removed': True})
+                summary['removed'] += 1
+        date_received, lsa_designation, lsa, pallet_text, length_m = key
+        for _ in range(qty - len(old_rows)):
+            new_records.append({
+                'order_id': order_id,
+                'date_received': date_received,
+                'lsa_designation': lsa_designation,
+                'lsa': lsa,
+                'pallet_text': pallet_text,
+                'qty': 1,
+                'weight': weight,
+                'length_m': length_m,
+                'assigned_lane': 0,
+                'import_order': 0,
+                'loaded': False,
+                'revision_removed': False,
+                'imported_file_id': imported_file_id,
+            })
     
-    # Reset all assignments first
-    for item in all_items:
-        item.assigned_lane = 0
+    # Otisky, které v revizi už nejsou
+    for old_rows in index.values():
+        for row in old_rows:
+            if not row.revision_removed:
+                updates.append({'b_id': row.id, 'b_weight': row.weight, 'b_removed': True})
+                summary['removed'] += 1
     
-    # Seskupení palet podle LSA kódu (zachová původní pořadí v rámci skupiny)
-    from collections import OrderedDict
+    # Nové palety: LSA, která už v zakázce je, zůstane ve své lane (té s nejvíce jejími
+    # paletami), nové skupiny LSA celé do nejméně zatížené lane; pořadí navazuje na konec zakázky
     lsa_groups = OrderedDict()
+    for record in new_records:
+        lsa_groups.setdefault(record['lsa'], []).append(record)
+    import_order = next_import_order(order_id)
+    for lsa, records in lsa_groups.items():
+        counts = lsa_lane_counts.get(lsa)
+        if counts:
+            lane_idx = counts.index(max(counts))
+        else:
+            lane_idx = lane_totals.index(min(lane_totals))
+        for record in records:
+            record['assigned_lane'] = lane_idx + 1
+            record['import_order'] = import_order
+            import_order += 1
+            lane_totals[lane_idx] += record['length_m']
     
-    for item in all_items:
-        lsa_code = item.lsa or 'NO_LSA'
-        if lsa_code not in lsa_groups:
-            lsa_groups[lsa_code] = []
-        lsa_groups[lsa_code].append(item)
+    update_stmt = table.update().where(table.c.id == db.bindparam('b_id')).values(
+        weight=db.bindparam('b_weight'),
+        revision_removed=db.bindparam('b_removed')
+    )
+    for i in range(0, len(updates), BULK_INSERT_CHUNK):
+        db.session.execute(update_stmt, updates[i:i + BULK_INSERT_CHUNK])
+    # Palety předchozího importu teď patří k revizi
+    db.session.execute(table.update().where(in_previous_import).values(imported_file_id=imported_file_id))
+    insert_stmt = table.insert()
+    for i in range(0, len(new_records), BULK_INSERT_CHUNK):
+        db.session.execute(insert_stmt, new_records[i:i + BULK_INSERT_CHUNK])
+    summary['inserted'] = len(new_records)
+    return summary
+
+# Rozdělování palet do lanes - LSA skupiny jako celky, vyvažování LPT a Karmarkar-Karp
+LANE_COUNT = 3
+DEFAULT_LANE_CAPACITY = 13.6
+LANE_UPDATE_CHUNK = 400  # Palet na jeden UPDATE ... CASE (id je v dotazu dvakrát, limit proměnných SQLite)
+
+class LanePlan:
+    """Výsledek rozdělení palet do lanes.
+
+    `lanes` je lane (1-3) pro každou paletu ve vstupním pořadí, `lane_totals`
+    součty délek a `quality` metriky kvality (viz `plan_quality`).
+    """
+
+    def __init__(self, lanes, lane_totals, quality, method):
+        self.lanes = lanes
+        self.lane_totals = lane_totals
+        self.quality = quality
+        self.method = method
+        self.strategy = None   # Název strategie z LANE_STRATEGIES (run_lane_strategy)
+        self.optimal = None    # Jen u přesného solveru - prokázané optimum
+        self.elapsed_s = None  # Doba výpočtu
+        self.cached = False    # Výsledek z LANE_PLAN_CACHE (cached_lane_strategy)
+
+    def copy(self):
+        plan = LanePlan(self.lanes.copy(), list(self.lane_totals), dict(self.quality), self.method)
+        plan.strategy, plan.optimal, plan.elapsed_s = self.strategy, self.optimal, self.elapsed_s
+        return plan
+
+    def to_dict(self):
+        data = {
+            'method': self.method,
+            'lane_totals': [round(total, 2) for total in self.lane_totals],
+            'quality': self.quality,
+        }
+        if self.strategy is not None:
+            data['strategy'] = self.strategy
+        if self.optimal is not None:
+            data['optimal'] = self.optimal
+        if self.elapsed_s is not None:
+            data['elapsed_s'] = self.elapsed_s
+        if self.cached:
+            data['cached'] = True
+        return data
+
+# Registr strategií přiřazení lanes - každá je funkce (arrays, lane_capacity_cm) -> LanePlan
+LANE_STRATEGIES = OrderedDict()
+DEFAULT_LANE_STRATEGY = 'balanced'
+
+def lane_strategy(name, label, time_budget=False):
+    """Dekorátor - zaregistruje výpočetní jádro jako pojmenovanou strategii.
+
+    `time_budget=True` znamená, že funkce přijímá `time_budget_s`.
+    """
+    def register(func):
+        LANE_STRATEGIES[name] = {'name': name, 'label': label, 'func': func, 'time_budget': time_budget}
+        return func
+    return register
+
+def run_lane_strategy(name, arrays, lane_capacity_cm, time_budget_s=None):
+    """Spustí strategii z registru a doplní do plánu její název a dobu výpočtu"""
+    strategy = LANE_STRATEGIES[name]
+    started = time.perf_counter()
+    if strategy['time_budget'] and time_budget_s is not None:
+        plan = strategy['func'](arrays, lane_capacity_cm, time_budget_s=time_budget_s)
+    else:
+        plan = strategy['func'](arrays, lane_capacity_cm)
+    plan.strategy = name
+    if plan.elapsed_s is None:
+        plan.elapsed_s = round(time.perf_counter() - started, 4)
+    return plan
+
+def resolve_lane_strategy(order=None):
+    """Strategie zakázky, jinak výchozí ze settings.json, jinak DEFAULT_LANE_STRATEGY"""
+    for name in (getattr(order, 'lane_strategy', None), SETTINGS.get('lane_strategy')):
+        if name in LANE_STRATEGIES:
+            return name
+    return DEFAULT_LANE_STRATEGY
+
+def _flatten_members(tree):
+    # Členové podmnožiny jsou kvůli O(1) slučování uložené jako vnořené dvojice
+    members = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if isinstance(node, tuple):
+            stack.extend(node)
+        else:
+            members.append(node)
+    return members
+
+def _pack_lpt(sizes, lane_count):
+    """LPT - skupiny od největší do nejméně zatížené lane. Vrací lane (0..) pro každou skupinu."""
+    heap = [(0.0, lane) for lane in range(lane_count)]
+    assignment = [0] * len(sizes)
+    for group in sorted(range(len(sizes)), key=lambda g: -sizes[g]):
+        total, lane = heapq.heappop(heap)
+        assignment[group] = lane
+        heapq.heappush(heap, (total + sizes[group], lane))
+    return assignment
+
+def _pack_karmarkar_karp(sizes, lane_count):
+    """Vícecestné Karmarkar-Karp (differencing) - slučuje dvě nejrozdílnější částečná řešení."""
+    if not sizes:
+        return []
+    heap = []
+    for group, size in enumerate(sizes):
+        subsets = [(size, group)] + [(0.0, None)] * (lane_count - 1)
+        heap.append((-size, group, subsets))
+    heapq.heapify(heap)
+    counter = len(sizes)
+    while len(heap) > 1:
+        _, _, first = heapq.heappop(heap)
+        _, _, second = heapq.heappop(heap)
+        # Největší podmnožinu jednoho řešení spojíme s nejmenší druhého
+        merged = [
+            (a_size + b_size, (a_members, b_members))
+            for (a_size, a_members), (b_size, b_members) in zip(first, reversed(second))
+        ]
+        merged.sort(key=lambda subset: -subset[0])
+        heapq.heappush(heap, (merged[-1][0] - merged[0][0], counter, merged))
+        counter += 1
+    assignment = [0] * len(sizes)
+    for lane, (_, members) in enumerate(heap[0][2]):
+        for group in _flatten_members(members):
+            assignment[group] = lane
+    return assignment
+
+def _split_group(group, lengths):
+    """Rozdělí skupinu palet (v pořadí) na dvě souvislé části co nejblíže polovině délky."""
+    half = sum(lengths[idx] for idx in group) / 2
+    running = 0
+    for cut, idx in enumerate(group[:-1], start=1):
+        running += lengths[idx]
+        if running >= half:
+            return group[:cut], group[cut:]
+    return group[:-1], group[-1:]
+
+def plan_quality(lane_totals, lane_capacity, split_groups=0):
+    """Metriky kvality rozdělení: rozptyl lanes, přetížení a počet rozdělených LSA"""
+    total = sum(lane_totals)
+    mean = total / len(lane_totals) if lane_totals else 0.0
+    spread = max(lane_totals) - min(lane_totals) if lane_totals else 0.0
+    return {
+        'max_lane_m': round(max(lane_totals, default=0.0), 2),
+        'spread_m': round(spread, 2),
+        'imbalance': round(spread / mean, 4) if mean else 0.0,  # Rozptyl vůči průměrné lane
+        'overflow_m': round(sum(max(0.0, lane_total - lane_capacity) for lane_total in lane_totals), 2),
+        'fits': all(lane_total <= lane_capacity + 1e-9 for lane_total in lane_totals),
+        'split_lsa_groups': split_groups,
+    }
+
+class LaneArrays:
+    """Kompaktní pole palet pro výpočet lanes - bez ORM objektů, seřazená podle pořadí importu.
+
+    `group_index` je číslo LSA skupiny (0.. v pořadí prvního výskytu),
+    `length_cm` délka v celých centimetrech. Výpočetní jádra pracují jen
+    s těmito poli a vrací vektor lanes, zápis do DB řeší write_lane_vector.
+    """
+
+    def __init__(self, ids, group_index, length_cm, import_order, assigned_lane=None, group_labels=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.group_index = np.asarray(group_index, dtype=np.int64)
+        self.length_cm = np.asarray(length_cm, dtype=np.int64)
+        self.import_order = np.asarray(import_order, dtype=np.int64)
+        self.assigned_lane = None if assigned_lane is None else np.asarray(assigned_lane, dtype=np.int64)
+        self.group_labels = group_labels
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_columns(cls, ids, lsa, length_m, import_order, assigned_lane=None):
+        lsa = ['NO_LSA' if value is None or value == '' else value for value in lsa]
+        group_index, labels = pd.factorize(pd.Series(lsa, dtype=object), sort=False)
+        length_cm = np.rint(np.nan_to_num(np.asarray(length_m, dtype=np.float64)) * 100)
+        return cls(ids, group_index, length_cm, import_order, assigned_lane, list(labels))
+
+    @classmethod
+    def from_pallets(cls, pallets):
+        """Z dvojic (lsa, length_m) v pořadí importu - pro simulace a náhledy"""
+        count = len(pallets)
+        return cls.from_columns(
+            np.arange(count), [lsa for lsa, _ in pallets], [length_m for _, length_m in pallets], np.arange(count)
+        )
+
+    @classmethod
+    def load(cls, order_id):
+        """Načte palety zakázky jedním dotazem na sloupce (bez ORM objektů)"""
+        table = PalletItem.__table__
+        return cls._query(table.c.order_id == order_id, (table.c.import_order, table.c.id))
+
+    @classmethod
+    def load_pool(cls, order_ids):
+        """Palety více zakázek najednou (zásoba pro plánování kamionů), po zakázkách v pořadí importu"""
+        table = PalletItem.__table__
+        return cls._query(table.c.order_id.in_(list(order_ids)), (table.c.order_id, table.c.import_order, table.c.id))
+
+    @classmethod
+    def _query(cls, where, order_by):
+        table = PalletItem.__table__
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.lsa, table.c.length_m, table.c.import_order, table.c.assigned_lane)
+            .where(where)
+            .order_by(*order_by)
+        ).all()
+        ids, lsa, length_m, import_order, assigned_lane = zip(*rows) if rows else ((),) * 5
+        length_m = [value or 0.0 for value in length_m]
+        import_order = [value or 0 for value in import_order]
+        assigned_lane = [value or 0 for value in assigned_lane]
+        return cls.from_columns(ids, lsa, length_m, import_order, assigned_lane)
+
+    def fingerprint(self):
+        """Otisk obsahu zakázky - multimnožina (LSA, délka, pořadí importu), nezávisle na lanes a id palet"""
+        digest = hashlib.md5()
+        digest.update('\x1f'.join(str(label) for label in (self.group_labels or ())).encode())
+        for column in (self.group_index, self.length_cm, self.import_order):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.hexdigest()
+
+    def take(self, indexes):
+        """Podmnožina palet (skupiny LSA se přečíslují od 0 v pořadí výskytu)"""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        group_index, groups = pd.factorize(self.group_index[indexes], sort=False)
+        labels = [self.group_labels[group] for group in groups] if self.group_labels is not None else None
+        return LaneArrays(
+            self.ids[indexes], group_index, self.length_cm[indexes], self.import_order[indexes],
+            None if self.assigned_lane is None else self.assigned_lane[indexes], labels
+        )
+
+def _lane_plan(lanes, length_cm, lane_capacity_cm, lane_count, split_groups, method):
+    lane_totals = (np.bincount(lanes, weights=length_cm, minlength=lane_count + 1)[1:lane_count + 1] / 100.0).tolist()
+    return LanePlan(lanes, lane_totals, plan_quality(lane_totals, lane_capacity_cm / 100.0, split_groups), method)
+
+def _heuristic_solve(sizes, lane_count):
+    """LPT i Karmarkar-Karp, vrací lepší (assignment, method) - menší maximum, pak menší rozptyl"""
+    best = None
+    for method, packer in (('lpt', _pack_lpt), ('karmarkar_karp', _pack_karmarkar_karp)):
+        assignment = packer(sizes, lane_count)
+        lane_totals = [0] * lane_count
+        for group, lane in enumerate(assignment):
+            lane_totals[lane] += sizes[group]
+        score = (max(lane_totals), max(lane_totals) - min(lane_totals))
+        if best is None or score < best[0]:
+            best = (score, assignment, method)
+    return best[1], best[2]
+
+def _pack_groups(arrays, lane_capacity_cm, lane_count, solve):
+    """Společná smyčka balení: LSA skupiny jako celky, rozdělení jen když se zakázka jinak nevejde.
+
+    `solve(sizes)` dostane celočíselné délky skupin a vrací (lane pro každou
+    skupinu, název metody). Vrací LanePlan s vektorem lanes (1..) v pořadí `arrays`.
+    Každé rozdělení skupiny znamená nové volání `solve` nad o jednu větší
+    množinou skupin - délky skupin se přitom jen upraví, nepočítají znovu.
+    """
+    lengths = arrays.length_cm.tolist()
+    # Indexy palet po skupinách, v rámci skupiny v pořadí importu
+    by_group = np.argsort(arrays.group_index, kind='stable')
+    bounds = np.cumsum(np.bincount(arrays.group_index))[:-1] if len(arrays) else []
+    groups = [part.tolist() for part in np.split(by_group, bounds)] if len(arrays) else []
+    group_codes = list(range(len(groups)))
+    feasible = sum(lengths) <= lane_capacity_cm * lane_count
     
-    # Přiřazení lanes: cyklicky 1,2,3,1,2,3... pro každou skupinu LSA
-    lane_counter = 0
+    sizes = [sum(lengths[idx] for idx in group) for group in groups]
+    split_codes = set()
+    while True:
+        assignment, method = solve(sizes)
+        lane_totals = [0] * lane_count
+        for group, lane in enumerate(assignment):
+            lane_totals[lane] += sizes[group]
+        
+        # Nevejde se to a celková délka by se vešla - rozdělíme největší LSA v nejplnější lane
+        worst_lane = lane_totals.index(max(lane_totals))
+        if not feasible or lane_totals[worst_lane] <= lane_capacity_cm:
+            break
+        candidates = [group for group, lane in enumerate(assignment) if lane == worst_lane and len(groups[group]) > 1]
+        if not candidates:
+            break
+        group = max(candidates, key=lambda g: sizes[g])
+        split_codes.add(group_codes[group])
+        head, tail = _split_group(groups[group], lengths)
+        head_size = sum(lengths[idx] for idx in head)
+        groups[group:group + 1] = [head, tail]
+        sizes[group:group + 1] = [head_size, sizes[group] - head_size]
+        group_codes[group:group + 1] = [group_codes[group]] * 2
     
-    for lsa_code, items in lsa_groups.items():
-        for item in items:
-            lane = (lane_counter % 3) + 1  # gives 1, 2, 3, 1, 2, 3, ...
-            item.assigned_lane = lane
-            lane_counter += 1
+    # Lanes číslujeme podle prvního výskytu v pořadí importu
+    lane_order = {}
+    for group in sorted(range(len(groups)), key=lambda g: groups[g][0]):
+        lane_order.setdefault(assignment[group], len(lane_order))
+    for lane in range(lane_count):
+        lane_order.setdefault(lane, len(lane_order))
+    lanes = np.zeros(len(arrays), dtype=np.int64)
+    for group, lane in zip(groups, assignment):
+        lanes[group] = lane_order[lane] + 1
+    return _lane_plan(lanes, arrays.length_cm, lane_capacity_cm, lane_count, len(split_codes), method)
+
+@lane_strategy('balanced', 'Vyrovnané lanes (LPT / Karmarkar-Karp)')
+def pack_lane_vector(arrays, lane_capacity_cm, lane_count=LANE_COUNT):
+    """Vyrovnané lanes s LSA pohromadě (LPT / Karmarkar-Karp, lepší vyhrává).
+
+    Jeden průchod je O(n + g log g) pro n palet a g skupin LSA. Každé nutné
+    rozdělení skupiny přidá další průchod, takže s s rozděleními je to
+    O(n + s·g log g) - v nejhorším případě (s i g řádu n) až O(n² log n).
+    """
+    return _pack_groups(arrays, lane_capacity_cm, lane_count, lambda sizes: _heuristic_solve(sizes, lane_count))
+
+# Přesný solver - délky v centimetrech, branch-and-bound s časovým limitem
+EXACT_SOLVER_BUDGET_S = float(SETTINGS.get('exact_solver_budget_s', 2.0))
+EXACT_SOLVER_CHECK_NODES = 4096  # Jak často se kontroluje časový limit
+
+def _branch_and_bound(sizes, lane_count, initial, deadline):
+    """Minimalizuje nejdelší lane pro celočíselné délky skupin.
+
+    Začíná od heuristického řešení `initial`, větve bez šance na zlepšení
+    ořezává, lanes se stejným zatížením zkouší jen jednou (symetrie).
+    Vrací (assignment, dokončeno) - dokončeno=True znamená prokázané optimum.
+    """
+    n = len(sizes)
+    if n == 0:
+        return initial, True
+    order = sorted(range(n), key=lambda i: -sizes[i])
+    ordered = [sizes[i] for i in order]
     
-    db.session.commit()
+    best_loads = [0] * lane_count
+    for group, lane in enumerate(initial):
+        best_loads[lane] += sizes[group]
+    best = max(best_loads)
+    best_choice = [initial[i] for i in order]
+    # Dolní mez: průměr, největší skupina, dvě nejmenší z lane_count + 1 největších
+    lower = max(-(-sum(ordered) // lane_count), ordered[0])
+    if n > lane_count:
+        lower = max(lower, ordered[lane_count - 1] + ordered[lane_count])
+    if best <= lower:
+        return initial, True
     
-    # Automatická optimalizace: přesuň palety z přetížených lanes
-    lane_totals = [0.0, 0.0, 0.0]
+    loads = [0] * lane_count
+    choice = [-1] * n
+    depth = 0
+    nodes = 0
+    while depth >= 0:
+        nodes += 1
+        if nodes % EXACT_SOLVER_CHECK_NODES == 0 and time.perf_counter() > deadline:
+            break
+        size = ordered[depth]
+        # Další lane pro skupinu na této úrovni (po předchozí volbě); po zlepšení
+        # `best` může být už rozpracovaná větev horší - pak se rovnou vracíme
+        lane = choice[depth] + 1 if max(loads) < best else lane_count
+        while lane < lane_count and (loads[lane] + size >= best or loads[lane] in loads[:lane]):
+            lane += 1
+        if lane == lane_count:
+            choice[depth] = -1
+            depth -= 1
+            if depth >= 0:
+                loads[choice[depth]] -= ordered[depth]
+            continue
+        choice[depth] = lane
+        if depth + 1 < n:
+            loads[lane] += size
+            depth += 1
+            continue
+        # Kompletní řešení - všechny lanes jsou kratší než dosavadní nejlepší
+        loads[lane] += size
+        best = max(loads)
+        best_choice = list(choice)
+        loads[lane] -= size
+        if best <= lower:
+            break
+    else:
+        # Prohledáno vše - nejlepší nalezené řešení je optimální
+        depth = None
     
-    # Spočítej aktuální zatížení lanes
-    for item in all_items:
-        if item.assigned_lane:
-            lane_totals[item.assigned_lane - 1] += item.length_m
+    assignment = [0] * n
+    for position, group in enumerate(order):
+        assignment[group] = best_choice[position]
+    return assignment, depth is None or best <= lower
+
+@lane_strategy('exact', 'Přesná optimalizace (branch-and-bound s časovým limitem)', time_budget=True)
+def exact_lane_vector(arrays, lane_capacity_cm, time_budget_s=EXACT_SOLVER_BUDGET_S, lane_count=LANE_COUNT):
+    """Přesné rozdělení do lanes s časovým limitem.
+
+    Stejná pravidla jako pack_lane_vector (LSA pohromadě, rozdělení jen při
+    přetečení), skupiny se ale rozdělují branch-and-bound hledáním s
+    minimem nejdelší lane. Po vypršení `time_budget_s` vrací nejlepší
+    nalezené řešení. `plan.optimal` říká, zda je optimum prokázané - jen
+    když žádná LSA nemusela být rozdělena. Dělení skupin je heuristické,
+    takže po něm optimum pro původní zadání neplatí, i když poslední
+    průchod doběhl celý.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget_s
+    proven = []
     
-    # Finalizace: přesuň palety z přetížených lanes
-    max_lane_capacity = 13.6
+    def solve(sizes):
+        initial, _ = _heuristic_solve(sizes, lane_count)
+        assignment, complete = _branch_and_bound(sizes, lane_count, initial, deadline)
+        proven.append(complete)
+        return assignment, 'exact'
     
-    for lane_idx in range(3):
-        if lane_totals[lane_idx] > max_lane_capacity:
-            # Najdi palety v této lane (seřazené od nejmenších)
-            lane_items = [item for item in all_items if item.assigned_lane == lane_idx + 1]
-            lane_items.sort(key=lambda x: x.length_m)
-            
-            # Zkus přesunout nejmenší palety
-            for item in lane_items:
-                if lane_totals[lane_idx] <= max_lane_capacity:
+    plan = _pack_groups(arrays, lane_capacity_cm, lane_count, solve)
+    # Jeden průchod = žádné rozdělení LSA, jen pak je výsledek optimem původní úlohy
+    plan.optimal = proven == [True] or not proven
+    # Jiné pořadí dělení LSA může heuristice vyjít lépe - přesný režim nesmí dopadnout hůř
+    heuristic = pack_lane_vector(arrays, lane_capacity_cm, lane_count)
+    rank = lambda candidate: (not candidate.quality['fits'], candidate.quality['overflow_m'], candidate.quality['max_lane_m'])
+    if rank(heuristic) < rank(plan):
+        heuristic.optimal = False
+        plan = heuristic
+    plan.elapsed_s = round(time.perf_counter() - started, 3)
+    return plan
+
+@lane_strategy('loading_order', 'Podle postupu nakládky (LSA postupně)')
+def loading_order_lane_vector(arrays, lane_capacity_cm, lane_count=LANE_COUNT):
+    """Přiřazení podle reálného postupu nakládky - LSA postupně v pořadí importu.
+
+    Celé LSA jde do nejméně zatížené lane, kam se vejde, jinak se jeho palety
+    rozdělí postupně 1,2,3,... Nakonec se z přetížených lanes přesunou
+    nejmenší palety tam, kde je místo.
+    """
+    lengths = arrays.length_cm.tolist()
+    lanes = [0] * len(lengths)
+    lane_totals = [0] * lane_count
+    groups = OrderedDict()
+    for idx, group in enumerate(arrays.group_index.tolist()):
+        groups.setdefault(group, []).append(idx)
+    
+    for indexes in groups.values():
+        group_length = sum(lengths[idx] for idx in indexes)
+        fitting = [lane for lane in range(lane_count) if lane_totals[lane] + group_length <= lane_capacity_cm]
+        if fitting:
+            best_lane = min(fitting, key=lambda lane: lane_totals[lane])
+            for idx in indexes:
+                lanes[idx] = best_lane + 1
+            lane_totals[best_lane] += group_length
+            continue
+        
+        # LSA se nevejde do žádné lane celé - první lane s místem, počínaje následující
+        current_lane = 0
+        for idx in indexes:
+            length = lengths[idx]
+            for attempt in range(lane_count):
+                lane = (current_lane + attempt) % lane_count
+                if lane_totals[lane] + length <= lane_capacity_cm:
                     break
-                    
-                # Najdi jinou lane s dostatečným místem
-                for target_lane in range(3):
-                    if target_lane != lane_idx and lane_totals[target_lane] + item.length_m <= max_lane_capacity:
-                        # Přesuň paletu
-                        lane_totals[lane_idx] -= item.length_m
-                        lane_totals[target_lane] += item.length_m
-                        item.assigned_lane = target_lane + 1
-                        break
+            else:
+                # Paleta se nevejde nikam - do nejméně zatížené lane
+                lane = lane_totals.index(min(lane_totals))
+            lanes[idx] = lane + 1
+            lane_totals[lane] += length
+            current_lane = (lane + 1) % lane_count
     
-    db.session.commit()
+    # Finalizace: z přetížených lanes přesuneme nejmenší palety tam, kde je místo
+    for lane in range(lane_count):
+        if lane_totals[lane] <= lane_capacity_cm:
+            continue
+        for idx in sorted((idx for idx in range(len(lanes)) if lanes[idx] == lane + 1), key=lambda idx: lengths[idx]):
+            if lane_totals[lane] <= lane_capacity_cm:
+                break
+            for target in range(lane_count):
+                if target != lane and lane_totals[target] + lengths[idx] <= lane_capacity_cm:
+                    lane_totals[lane] -= lengths[idx]
+                    lane_totals[target] += lengths[idx]
+                    lanes[idx] = target + 1
+                    break
+    
+    split_groups = sum(1 for indexes in groups.values() if len(set(lanes[idx] for idx in indexes)) > 1)
+    return _lane_plan(np.asarray(lanes, dtype=np.int64), arrays.length_cm, lane_capacity_cm, lane_count, split_groups, 'loading_order')
+
+@lane_strategy('round_robin', 'Round-robin po LSA (původní auto-assign)')
+def round_robin_lane_vector(arrays, lane_capacity_cm, lane_count=LANE_COUNT):
+    """Původní auto-assign: palety po LSA skupinách cyklicky 1,2,3,... a přesun
+    nejmenších palet z přetížených lanes. Zůstává pro porovnání strategií.
+    """
+    lengths = arrays.length_cm.tolist()
+    order = np.argsort(arrays.group_index, kind='stable').tolist()
+    lanes = [0] * len(lengths)
+    lane_totals = [0] * lane_count
+    for position, idx in enumerate(order):
+        lanes[idx] = position % lane_count + 1
+        lane_totals[position % lane_count] += lengths[idx]
+    
+    for lane in range(lane_count):
+        if lane_totals[lane] <= lane_capacity_cm:
+            continue
+        for idx in sorted((idx for idx in range(len(lanes)) if lanes[idx] == lane + 1), key=lambda idx: lengths[idx]):
+            if lane_totals[lane] <= lane_capacity_cm:
+                break
+            for target in range(lane_count):
+                if target != lane and lane_totals[target] + lengths[idx] <= lane_capacity_cm:
+                    lane_totals[lane] -= lengths[idx]
+                    lane_totals[target] += lengths[idx]
+                    lanes[idx] = target + 1
+                    break
+    
+    split_groups = int((pd.Series(lanes).groupby(arrays.group_index).nunique() > 1).sum()) if lanes else 0
+    return _lane_plan(np.asarray(lanes, dtype=np.int64), arrays.length_cm, lane_capacity_cm, lane_count, split_groups, 'round_robin')
+
+# Výsledky strategií podle otisku obsahu zakázky - přidání, odebrání nebo přesun
+# palety změní otisk, takže stará položka se už nenajde a časem vypadne (LRU).
+# Neprokázané výsledky přesného solveru se neukládají - s větším limitem může vyjít lepší.
+LANE_PLAN_CACHE = TTLCache(max_entries=256)
+
+def cache_lane_plan(key, plan):
+    if plan.optimal is not False:
+        LANE_PLAN_CACHE.put(key, plan.copy())
+
+def cached_lane_strategy(name, arrays, lane_capacity_cm, time_budget_s=None):
+    """run_lane_strategy s cache podle (otisk palet, strategie, kapacita, časový limit)"""
+    key = (arrays.fingerprint(), name, lane_capacity_cm, time_budget_s, LANE_COUNT)
+    plan = LANE_PLAN_CACHE.get(key)
+    if plan is not None:
+        plan = plan.copy()
+        plan.cached = True
+        return plan
+    plan = run_lane_strategy(name, arrays, lane_capacity_cm, time_budget_s)
+    cache_lane_plan(key, plan)
+    return plan
+
+def pack_lanes(pallets, lane_capacity=DEFAULT_LANE_CAPACITY, lane_count=LANE_COUNT):
+    """pack_lane_vector pro seznam (lsa, length_m) v pořadí importu - bez databáze"""
+    return pack_lane_vector(LaneArrays.from_pallets(pallets), int(round(lane_capacity * 100)), lane_count)
+
+def solve_lanes_exact(pallets, lane_capacity=DEFAULT_LANE_CAPACITY, time_budget_s=EXACT_SOLVER_BUDGET_S, lane_count=LANE_COUNT):
+    """exact_lane_vector pro seznam (lsa, length_m) v pořadí importu - bez databáze"""
+    return exact_lane_vector(LaneArrays.from_pallets(pallets), int(round(lane_capacity * 100)), time_budget_s, lane_count)
+
+def write_lane_vector(arrays, lanes):
+    """Zapíše vektor lanes hromadným UPDATE ... CASE (jen změněné palety, bez commitu).
+
+    Vrací počet změněných palet.
+    """
+    lanes = np.asarray(lanes, dtype=np.int64)
+    changed = np.ones(len(lanes), dtype=bool) if arrays.assigned_lane is None else lanes != arrays.assigned_lane
+    ids = arrays.ids[changed].tolist()
+    new_lanes = lanes[changed].tolist()
+    table = PalletItem.__table__
+    for i in range(0, len(ids), LANE_UPDATE_CHUNK):
+        mapping = dict(zip(ids[i:i + LANE_UPDATE_CHUNK], new_lanes[i:i + LANE_UPDATE_CHUNK]))
+        db.session.execute(
+            table.update()
+            .where(table.c.id.in_(list(mapping)))
+            .values(assigned_lane=db.case(mapping, value=table.c.id))
+        )
+    if arrays.assigned_lane is not None:
+        arrays.assigned_lane = lanes.copy()
+    return len(ids)
+
+def _lane_chunks(group, lengths, lane_capacity_cm):
+    """Rozdělí LSA skupinu delší než lane na souvislé části, které se do lane vejdou"""
+    chunks = [[]]
+    running = 0
+    for idx in group:
+        if chunks[-1] and running + lengths[idx] > lane_capacity_cm:
+            chunks.append([])
+            running = 0
+        chunks[-1].append(idx)
+        running += lengths[idx]
+    return chunks
+
+def plan_trucks(arrays, lane_capacity_cm, lane_count=LANE_COUNT):
+    """Rozdělí zásobu palet do co nejmenšího počtu kamionů (lane_count lanes po lane_capacity_cm).
+
+    LSA skupina jde celá do jedné lane, delší skupina se rozdělí na souvislé
+    části. Části se umisťují od největší (Best Fit Decreasing) do lane,
+    kde po vložení zbude nejméně místa, a každý kamion se nakonec vyrovná
+    pack_lane_vector (pokud se tím nic nepřelije). Vrací seznam
+    (indexy palet v `arrays`, LanePlan) pro každý kamion.
+    """
+    lengths = arrays.length_cm.tolist()
+    groups = OrderedDict()
+    for idx, group in enumerate(arrays.group_index.tolist()):
+        groups.setdefault(group, []).append(idx)
+    
+    chunks = []
+    for group in groups.values():
+        for chunk in _lane_chunks(group, lengths, lane_capacity_cm):
+            chunks.append((sum(lengths[idx] for idx in chunk), chunk))
+    chunks.sort(key=lambda chunk: -chunk[0])
+    
+    free = []          # Volné místo po lanes, truck * lane_count + lane
+    placement = []     # (kamion, lane, část)
+    for size, chunk in chunks:
+        best = None
+        for slot, room in enumerate(free):
+            if size <= room and (best is None or room < free[best]):
+                best = slot
+                if room == size:
+                    break
+        if best is None:
+            # Nový kamion (případně i pro paletu delší než lane)
+            best = len(free)
+            free.extend([lane_capacity_cm] * lane_count)
+        free[best] -= size
+        placement.append((best // lane_count, best % lane_count, chunk))
+    
+    truck_count = len(free) // lane_count
+    truck_indexes = [[] for _ in range(truck_count)]
+    truck_lanes = [{} for _ in range(truck_count)]
+    for truck, lane, chunk in placement:
+        truck_indexes[truck].extend(chunk)
+        for idx in chunk:
+            truck_lanes[truck][idx] = lane + 1
+    
+    trucks = []
+    for truck in range(truck_count):
+        indexes = np.sort(np.asarray(truck_indexes[truck], dtype=np.int64))
+        subset = arrays.take(indexes)
+        plan = pack_lane_vector(subset, lane_capacity_cm, lane_count)
+        if not plan.quality['fits']:
+            # Vyrovnání by lane přelilo - necháme rozložení z balení
+            lanes = np.asarray([truck_lanes[truck][idx] for idx in indexes.tolist()], dtype=np.int64)
+            split_groups = sum(1 for group in set(subset.group_index.tolist()) if len(set(lanes[subset.group_index == group].tolist())) > 1)
+            plan = _lane_plan(lanes, subset.length_cm, lane_capacity_cm, lane_count, split_groups, 'best_fit_decreasing')
+        trucks.append((indexes, plan))
+    # Kamiony v pořadí nejstarší palety (zásoba je seřazená po zakázkách a importu)
+    trucks.sort(key=lambda truck: truck[0][0] if len(truck[0]) else 0)
+    return trucks
+
+def auto_assign_lanes(order_id):
+    """Automaticky přiřadí palety do lanes strategií zakázky (výchozí: vyrovnané lanes, LSA pohromadě)"""
+    order = Order.query.get_or_404(order_id)
+    arrays = LaneArrays.load(order.id)
+    
+    if not len(arrays):
+        return None
+    
+    plan = cached_lane_strategy(resolve_lane_strategy(order), arrays, int(round((order.capacity_m or DEFAULT_LANE_CAPACITY) * 100)))
+    # Beze změny lanes (opakované auto-assign) se nic nezapisuje
+    if write_lane_vector(arrays, plan.lanes):
+        mark_order_aggregates([order.id])
+        db.session.commit()
+    return plan
+
+class UploadTooLarge(Exception):
+    pass
+
+def spool_upload(stream, directory, max_bytes=IMPORT_MAX_FILE_BYTES, chunk_size=1024 * 1024):
+    """Uloží stream po blocích do dočasného souboru a zároveň počítá SHA-256.
+
+    Soubor se tak čte jen jednou. Při překročení `max_bytes` se zápis
+    přeruší a vyhodí se UploadTooLarge. Vrací (cesta, hash, velikost).
+    """
+    os.makedirs(directory, exist_ok=True)
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f'Soubor je větší než povolený limit {max_bytes // (1024 * 1024)} MB')
+                sha256.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, sha256.hexdigest(), size
+
+MMAP_MIN_BYTES = 64 * 1024
+
+class _MappedFile:
+    """mmap jako souborový objekt pro zipfile/openpyxl (mmap před Pythonem 3.13 nemá seekable())"""
 
-def calculate_file_hash(file_content):
-    """Calculate SHA256 hash of file content"""
-    return hashlib.sha256(file_content).hexdigest()
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def seekable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._mapped, name)
+
+@contextmanager
+def open_spooled(path):
+    """Otevře uložený upload pro parser - pokud to jde, jako memory-mapped soubor"""
+    with open(path, 'rb') as f:
+        mapped = None
+        # Malé soubory nemá smysl mapovat, čteme je běžně
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_BYTES:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Souborový systém bez podpory mmap
+                mapped = None
+        if mapped is None:
+            yield f
+        else:
+            with mapped:
+                yield _MappedFile(mapped)
 
 def send_email(to_emails, subject, body, html_body=None, sender_email=None, reply_to=None):
     """Odešle email pomocí SMTP konfigurace nebo API služeb (SendGrid/Mailgun)"""
@@ -379,42 +1980,74 @@ def send_email(to_emails, subject, body, html_body=None, sender_email=None, repl
     except Exception as e:
         return False, f"Chyba při odesílání emailu: {str(e)}"
 
+class OrderSnapshot:
+    """Agregovaný stav zakázky z jednoho dotazu na sloupce palet (bez ORM objektů).
+
+    Jedním průchodem spočítá součty lanes, LSA souhrn, cenu a příznaky
+    kapacity. Sdílí ho tisky, close_order i generátory e-mailů (kostru
+    stránky zakázky počítá levněji OrderPageStats z agregátů Order).
+    """
+
+    COLUMNS = ('id', 'date_received', 'lsa_designation', 'lsa', 'pallet_text', 'length_m', 'weight',
+               'assigned_lane', 'import_order', 'loaded', 'revision_removed')
+
+    def __init__(self, order, pallets):
+        self.order_id = order.id
+        self.pallets = pallets  # Řádky v pořadí importu
+        self.lane_totals = {lane: 0.0 for lane in range(1, LANE_COUNT + 1)}
+        self.lsa_summary = {}
+        
+        for pallet in pallets:
+            lane = pallet.assigned_lane or 0
+            if lane not in self.lane_totals:
+                continue
+            self.lane_totals[lane] += pallet.length_m or 0.0
+            
+            # LSA souhrn jen z přiřazených palet
+            summary = self.lsa_summary.get(pallet.lsa)
+            if summary is None:
+                summary = self.lsa_summary[pallet.lsa] = {
+                    'count': 0, 'total_weight': 0.0, 'lengths': {}, 'loaded_count': 0, 'is_all_loaded': False
+                }
+            summary['count'] += 1
+            summary['total_weight'] += pallet.weight or 0.0
+            if pallet.loaded:
+                summary['loaded_count'] += 1
+            length_key = f"{pallet.length_m or 0.0:.1f}m"
+            summary['lengths'][length_key] = summary['lengths'].get(length_key, 0) + 1
+        
+        for summary in self.lsa_summary.values():
+            summary['is_all_loaded'] = summary['loaded_count'] == summary['count']
+        
+        self.pallet_places, self.price, self.is_full = compute_pallet_price(
+            list(self.lane_totals.values()), order.price_per_place, order.full_truck_price
+        )
+        self.max_lane = max(self.lane_totals.values())
+        self.over_capacity = self.max_lane > order.capacity_m
+
+    @classmethod
+    def load(cls, order):
+        table = PalletItem.__table__
+        pallets = db.session.execute(
+            db.select(*[table.c[name] for name in cls.COLUMNS])
+            .where(table.c.order_id == order.id)
+            .order_by(table.c.import_order, table.c.id)
+        ).all()
+        return cls(order, pallets)
+
+def get_order_snapshot(order):
+    """OrderSnapshot zakázky - v rámci jednoho requestu se počítá jen jednou"""
+    if not has_app_context():
+        return OrderSnapshot.load(order)
+    snapshots = g.setdefault('order_snapshots', {})
+    snapshot = snapshots.get(order.id)
+    if snapshot is None:
+        snapshot = snapshots[order.id] = OrderSnapshot.load(order)
+    return snapshot
+
 def generate_lsa_summary(order):
     """Vygeneruje shrnutí LSA kódů s počty palet a stavem naložení"""
-    lsa_summary = {}
-    
-    for item in order.items:
-        if item.assigned_lane in (1, 2, 3):  # Pouze přiřazené palety
-            if item.lsa not in lsa_summary:
-                lsa_summary[item.lsa] = {
-                    'count': 0,
-                    'total_weight': 0.0,
-                    'lengths': {},
-                    'loaded_count': 0,
-                    'is_all_loaded': True  # Začneme s True a změníme na False pokud najdeme nenaložené
-                }
-            
-            lsa_summary[item.lsa]['count'] += 1
-            lsa_summary[item.lsa]['total_weight'] += item.weight
-            
-            # Počítání naložených palet
-            if item.loaded:
-                lsa_summary[item.lsa]['loaded_count'] += 1
-            else:
-                lsa_summary[item.lsa]['is_all_loaded'] = False
-            
-            # Grupování podle délky
-            length_key = f"{item.length_m:.1f}m"
-            if length_key not in lsa_summary[item.lsa]['lengths']:
-                lsa_summary[item.lsa]['lengths'][length_key] = 0
-            lsa_summary[item.lsa]['lengths'][length_key] += 1
-    
-    # Finální kontrola is_all_loaded
-    for lsa_data in lsa_summary.values():
-        if lsa_data['loaded_count'] == 0:
-            lsa_data['is_all_loaded'] = False
-    
-    return lsa_summary
+    return get_order_snapshot(order).lsa_summary
 
 def generate_carrier_email_body(order):
     """Vygeneruje text emailu pro dopravce"""
@@ -522,121 +2155,749 @@ def send_order_email(order):
         body = f"""
 Dobrý den,
 
-zasíláme objednávku nakládky:
+zasíláme objednávku nakládky:
+
+Zakázka: {order.name}
+Vytvořeno: {order.created_at.strftime('%d.%m.%Y %H:%M')}
+Dopravce: {order.carrier_name or 'neuvedeno'}
+Nakládka: {order.pickup_datetime.strftime('%d.%m.%Y %H:%M') if order.pickup_datetime else 'neuvedeno'}
+Kamion: {order.truck_license_plate or 'neuvedeno'}
+
+Detaily naleznete v příloze.
+
+S pozdravem,
+Hueppe systém
+"""
+        
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        
+        # Create CSV attachment
+        csv_data = "lsa,pallet_text,length_m,assigned_lane,weight\n"
+        for it in get_order_snapshot(order).pallets:
+            csv_data += f'{it.lsa},{it.pallet_text},{it.length_m},{it.assigned_lane},{it.weight}\n'
+        
+        attachment = MIMEBase('application', 'octet-stream')
+        attachment.set_payload(csv_data.encode('utf-8'))
+        encoders.encode_base64(attachment)
+        attachment.add_header('Content-Disposition', f'attachment; filename="order_{order.id}.csv"')
+        msg.attach(attachment)
+        
+        # Send email
+        server = smtplib.SMTP(smtp_config['host'], smtp_config.get('port', 587))
+        if smtp_config.get('use_tls', True):
+            server.starttls()
+        server.login(smtp_config['username'], smtp_config['password'])
+        server.send_message(msg)
+        server.quit()
+        
+        return True
+        
+    except Exception as e:
+        flash(f'Chyba při odesílání e-mailu: {str(e)}', 'danger')
+        return False
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+# Seznamy zakázek se stránkují podle klíče (created_at, id) - kurzor je klíč
+# poslední / první zobrazené zakázky, takže cena stránky nezávisí na její pozici.
+# Starší zakázky mohou mít created_at NULL - řadí se na konec seznamu (kurzor 'null_id').
+ORDER_PAGE_SIZE = 50
+ORDER_FILTER_FIELDS = ('carrier', 'date_from', 'date_to', 'number', 'lsa')
+
+def order_list_filters(args):
+    """Neprázdné filtry seznamu zakázek z query stringu"""
+    return {name: args.get(name, '').strip() for name in ORDER_FILTER_FIELDS if args.get(name, '').strip()}
+
+def apply_order_filters(query, filters):
+    """Filtry dopravce, rozsahu data vytvoření, čísla ZA/OO a kódu LSA"""
+    if filters.get('carrier'):
+        query = query.filter(Order.carrier_name.ilike(f"%{filters['carrier']}%"))
+    if filters.get('number'):
+        pattern = f"%{filters['number']}%"
+        query = query.filter(db.or_(Order.za_number.ilike(pattern), Order.oo_number.ilike(pattern)))
+    if filters.get('lsa'):
+        query = query.filter(Order.id.in_(
+            db.select(PalletItem.order_id).where(PalletItem.lsa == filters['lsa'])
+        ))
+    try:
+        if filters.get('date_from'):
+            query = query.filter(Order.created_at >= datetime.strptime(filters['date_from'], '%Y-%m-%d'))
+        if filters.get('date_to'):
+            # Včetně celého dne date_to
+            query = query.filter(Order.created_at < datetime.strptime(filters['date_to'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Neplatné datum ve filtru (očekává se RRRR-MM-DD)', 'warning')
+    return query
+
+def encode_order_cursor(order):
+    created_at = order.created_at.isoformat() if order.created_at else 'null'
+    return f"{created_at}_{order.id}"
+
+def decode_order_cursor(value):
+    """Kurzor 'created_at_id' -> (datetime nebo None, id), neplatný kurzor -> None"""
+    created_at, _, order_id = (value or '').rpartition('_')
+    try:
+        return (None if created_at == 'null' else datetime.fromisoformat(created_at)), int(order_id)
+    except ValueError:
+        return None
+
+def _older_than_cursor(cursor):
+    """Zakázky za kurzorem v pořadí seznamu (created_at DESC NULLS LAST, id DESC)"""
+    created_at, order_id = cursor
+    if created_at is None:
+        return db.and_(Order.created_at.is_(None), Order.id < order_id)
+    return db.or_(
+        Order.created_at < created_at,
+        db.and_(Order.created_at == created_at, Order.id < order_id),
+        Order.created_at.is_(None),
+    )
+
+def _newer_than_cursor(cursor):
+    """Zakázky před kurzorem v pořadí seznamu - čtou se obráceně (created_at ASC NULLS FIRST, id ASC)"""
+    created_at, order_id = cursor
+    if created_at is None:
+        return db.or_(Order.created_at.isnot(None), Order.id > order_id)
+    return db.or_(
+        Order.created_at > created_at,
+        db.and_(Order.created_at == created_at, Order.id > order_id),
+    )
+
+def paginate_orders(query, after=None, before=None, page_size=ORDER_PAGE_SIZE):
+    """Stránka zakázek od nejnovějších. after/before jsou kurzory sousední stránky."""
+    before = decode_order_cursor(before) if before else None
+    after = decode_order_cursor(after) if after and not before else None
+    if before:
+        # Předchozí stránka - čte se vzestupně od kurzoru a otočí
+        orders = query.filter(_newer_than_cursor(before)).order_by(
+            Order.created_at.asc().nulls_first(), Order.id
+        ).limit(page_size + 1).all()
+        has_prev, has_next = len(orders) > page_size, True
+        orders = orders[:page_size][::-1]
+    else:
+        if after:
+            query = query.filter(_older_than_cursor(after))
+        orders = query.order_by(
+            Order.created_at.desc().nulls_last(), Order.id.desc()
+        ).limit(page_size + 1).all()
+        has_prev, has_next = after is not None, len(orders) > page_size
+        orders = orders[:page_size]
+    return {
+        'orders': orders,
+        'next': encode_order_cursor(orders[-1]) if has_next and orders else None,
+        'prev': encode_order_cursor(orders[0]) if has_prev and orders else None,
+    }
+
+@app.route('/loading_orders')
+def loading_orders():
+    # Zobrazí pouze aktivní zakázky (nedelivered), po stránkách
+    filters = order_list_filters(request.args)
+    query = apply_order_filters(Order.query.filter_by(delivered=False), filters)
+    page = paginate_orders(query, request.args.get('after'), request.args.get('before'))
+    # Přehled počítá celý nedoručený stav (ne jen stránku) jedním dotazem
+    open_order = db.and_(Order.closed == False, Order.saved_for_later == False)
+    total, active, saved, closed = db.session.execute(
+        db.select(
+            db.func.count(Order.id),
+            db.func.coalesce(db.func.sum(db.case((open_order, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((Order.saved_for_later == True, 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((Order.closed == True, 1), else_=0)), 0),
+        ).where(Order.delivered == False)
+    ).one()
+    counts = {'total': total, 'active': active, 'saved': saved, 'closed': closed}
+    return render_template('loading_orders.html', orders=page['orders'], page=page, filters=filters, counts=counts)
+
+@app.route('/archive')
+def archive():
+    """Archiv doručených zakázek (stránkovaný, s filtry)"""
+    filters = order_list_filters(request.args)
+    query = apply_order_filters(Order.query.filter_by(delivered=True), filters)
+    page = paginate_orders(query, request.args.get('after'), request.args.get('before'))
+    return render_template('archive.html', orders=page['orders'], page=page, filters=filters)
+
+@app.route('/create_order', methods=['POST'])
+def create_order():
+    name = request.form.get('name') or f'Order {datetime.utcnow().isoformat()}'
+    order = Order(name=name)
+    db.session.add(order)
+    db.session.commit()
+    return redirect(url_for('order_view', order_id=order.id))
+
+# Stránka zakázky je lehká kostra ze souhrnů zakázky - tabulku palet a lanes
+# si prohlížeč načítá po stránkách z order_pallets
+ORDER_PALLETS_PAGE_SIZE = 200
+ORDER_PALLETS_MAX_PAGE_SIZE = 1000
+
+class OrderPageStats:
+    """Souhrny pro kostru stránky zakázky - z agregátů Order a jednoho dotazu na počty v lanes"""
+
+    def __init__(self, order):
+        table = PalletItem.__table__
+        rows = db.session.execute(
+            db.select(
+                table.c.assigned_lane,
+                db.func.count(table.c.id),
+                db.func.coalesce(db.func.sum(db.case((table.c.revision_removed == True, 1), else_=0)), 0),
+            )
+            .where(table.c.order_id == order.id)
+            .group_by(table.c.assigned_lane)
+        ).all()
+        self.lane_counts = {lane: 0 for lane in range(LANE_COUNT + 1)}
+        self.revision_removed_count = 0
+        for lane, count, removed in rows:
+            if (lane or 0) in self.lane_counts:
+                self.lane_counts[lane or 0] += count
+            self.revision_removed_count += removed
+        self.pallet_count = order.pallet_count or 0
+        self.total_weight = order.total_weight or 0.0
+        self.lane_totals = {lane: getattr(order, f'lane_{lane}_m') or 0.0 for lane in range(1, LANE_COUNT + 1)}
+        self.pallet_places, self.price, self.is_full = compute_pallet_price(
+            list(self.lane_totals.values()), order.price_per_place, order.full_truck_price
+        )
+
+def _pallet_rows(query):
+    return [dict(row._mapping) for row in db.session.execute(query).all()]
+
+def order_pallet_page(order, view, lane=None, offset=0, limit=ORDER_PALLETS_PAGE_SIZE):
+    """Stránka palet zakázky pro order.html.
+
+    view='table' - palety v pořadí importu (tabulka), view='lane' - palety jedné
+    lane v pořadí vizualizace (LSA skupiny podle prvního výskytu, uvnitř pořadí
+    importu), view='lsa' - LSA skupiny s počty a délkou.
+    """
+    table = PalletItem.__table__
+    columns = [table.c[name] for name in OrderSnapshot.COLUMNS]
+    in_order = table.c.order_id == order.id
+    
+    if view == 'lsa':
+        query = (
+            db.select(table.c.lsa, db.func.count(table.c.id).label('count'),
+                      db.func.coalesce(db.func.sum(table.c.length_m), 0.0).label('length_m'))
+            .where(in_order)
+            .group_by(table.c.lsa)
+            .order_by(db.func.min(table.c.import_order), db.func.min(table.c.id))
+        )
+        groups = _pallet_rows(query)
+        return {'view': view, 'total': len(groups), 'offset': 0, 'items': groups}
+    
+    if view == 'lane':
+        if lane:
+            in_lane = table.c.assigned_lane == lane
+        else:
+            in_lane = db.or_(table.c.assigned_lane == 0, table.c.assigned_lane.is_(None))
+        total = db.session.execute(db.select(db.func.count(table.c.id)).where(in_order, in_lane)).scalar()
+        query = db.select(*columns).where(in_order, in_lane)
+        if lane:
+            group_key = db.func.coalesce(table.c.lsa, '')
+            groups = (
+                db.select(group_key.label('group_key'),
+                          db.func.min(table.c.import_order).label('first_import'),
+                          db.func.min(table.c.id).label('first_id'))
+                .where(in_order)
+                .group_by(group_key)
+                .subquery()
+            )
+            query = query.join(groups, group_key == groups.c.group_key).order_by(
+                groups.c.first_import, groups.c.first_id, table.c.import_order, table.c.id
+            )
+        else:
+            # Nepřiřazené palety se zobrazují v pořadí importu
+            query = query.order_by(table.c.import_order, table.c.id)
+    else:
+        view = 'table'
+        total = order.pallet_count or 0
+        query = db.select(*columns).where(in_order).order_by(table.c.import_order, table.c.id)
+    
+    items = _pallet_rows(query.offset(offset).limit(limit))
+    return {'view': view, 'lane': lane, 'total': total, 'offset': offset, 'items': items}
+
+# Podmíněné GET pohledů zakázky - ETag z Order.version a Order.cache_token (+ pohled,
+# nastavení, verze kódu a šablon), shoda vrací 304 bez výpočtu. Vykreslené HTML se drží
+# v cache podle (order_id, cache_token, version, ETag), opakované vykreslení je zdarma.
+ORDER_RENDER_CACHE = TTLCache(max_entries=128, ttl_seconds=30 * 60, max_size=32 * 1024 * 1024, sizeof=len)
+
+def _deploy_fingerprint():
+    # Otisk app.py a šablon - stejný ve všech WSGI workerech, změní se s nasazením
+    digest = hashlib.md5()
+    paths = [os.path.abspath(__file__)]
+    template_dir = os.path.join(app.root_path, app.template_folder or 'templates')
+    for root, _, files in sorted(os.walk(template_dir)):
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.html'))
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(path.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+ORDER_ETAG_DEPLOY = _deploy_fingerprint()
+
+def _settings_fingerprint():
+    # SMTP údaje se do ETagu nepromítají
+    relevant = {key: value for key, value in SETTINGS.items() if key != 'smtp'}
+    return hashlib.md5(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:8]
+
+def order_etag(order, view, *extra):
+    """ETag pohledu zakázky - mění se s verzí zakázky, nastavením a nasazením nové verze aplikace"""
+    parts = [order.id, order.cache_token, order.version or 0, view, *extra, _settings_fingerprint(), ORDER_ETAG_DEPLOY]
+    return hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def order_not_modified(etag):
+    """Odpověď 304, pokud klient má aktuální verzi, jinak None (čekající flash zprávy se musí vykreslit)"""
+    if session.get('_flashes') or not request.if_none_match.contains(etag):
+        return None
+    return order_conditional(make_response('', 304), etag)
+
+def order_conditional(response, etag):
+    """ETag a revalidace při každém požadavku (prohlížeč posílá If-None-Match)"""
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cached_order_render(order, etag, render):
+    """Vykreslený pohled zakázky z ORDER_RENDER_CACHE, jinak render()"""
+    if session.get('_flashes'):
+        return render()  # base.html vykreslí flash zprávy - takové HTML se necachuje
+    key = (order.id, order.cache_token, order.version or 0, etag)
+    html = ORDER_RENDER_CACHE.get(key)
+    if html is None:
+        html = render()
+        ORDER_RENDER_CACHE.put(key, html)
+    return html
+
+@app.route('/order/<int:order_id>')
+def order_view(order_id):
+    order = Order.query.get_or_404(order_id)
+    
+    # Rozběhnuté importy na pozadí - stránka se na ně dotazuje a po dokončení obnoví
+    active_import_jobs = ImportJob.query.filter(
+        ImportJob.order_id == order.id,
+        ImportJob.phase.notin_(IMPORT_JOB_FINISHED)
+    ).order_by(ImportJob.id).all()
+    
+    etag = order_etag(order, 'order_view', *[f'{job.id}{job.phase}' for job in active_import_jobs])
+    not_modified = order_not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    def render():
+        stats = OrderPageStats(order)
+        return render_template(
+            'order.html', order=order, stats=stats, lane_totals=stats.lane_totals, pallet_places=stats.pallet_places,
+            price=stats.price, is_full=stats.is_full, total_weight=stats.total_weight,
+            lsa_summary=generate_lsa_summary(order) if order.closed else {}, page_size=ORDER_PALLETS_PAGE_SIZE,
+            active_import_jobs=active_import_jobs, lane_strategies=LANE_STRATEGIES, lane_strategy=resolve_lane_strategy(order)
+        )
+    return order_conditional(cached_order_render(order, etag, render), etag)
+
+@app.route('/order/<int:order_id>/pallets')
+def order_pallets(order_id):
+    """JSON stránka palet zakázky (view=table|lane|lsa, lane, offset, limit)"""
+    order = Order.query.get_or_404(order_id)
+    view = request.args.get('view', 'table')
+    lane = request.args.get('lane', 0, type=int)
+    if view == 'lane' and not 0 <= lane <= LANE_COUNT:
+        return jsonify({'success': False, 'error': 'Neplatná lane'}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', ORDER_PALLETS_PAGE_SIZE, type=int), 1), ORDER_PALLETS_MAX_PAGE_SIZE)
+    return jsonify({'success': True, **order_pallet_page(order, view, lane, offset, limit)})
+
+# Importy na pozadí - upload jen uloží soubor a založí ImportJob, zbytek dělá worker
+IMPORT_JOBS_DIR = os.path.join(BASE_DIR, 'import_jobs')
+IMPORT_JOB_FINISHED = ('done', 'failed')
+IMPORT_JOB_RUNNING = ('parsing', 'inserting', 'assigning')
+IMPORT_JOB_STALE_SECONDS = 600  # Běžící job bez aktualizace déle než toto = přerušený
+# Jak se spouštějí úlohy na pozadí: thread = worker thread v procesu aplikace,
+# inline = hned v requestu (hosting bez threadů), scheduled = jen se zařadí a
+# zpracuje je naplánovaná úloha `flask --app app run-jobs` (PythonAnywhere)
+BACKGROUND_JOBS_MODE = SETTINGS.get('background_jobs', 'thread')
+
+class ImportJobLost(Exception):
+    """Job mezitím převzal jiný běh (byl považován za přerušený)"""
+
+# Fronta úloh na pozadí - (runner, job_id); importy i přepočty lanes běží
+# v jednom workeru, takže do SQLite nezapisují souběžně
+_import_queue = queue.Queue()
+_import_worker = None
+_import_worker_lock = threading.Lock()
+
+def _import_worker_loop():
+    while True:
+        try:
+            runner, job_id = _import_queue.get(timeout=IMPORT_JOB_STALE_SECONDS)
+        except queue.Empty:
+            # Při nečinnosti zkontrolujeme přerušené joby (např. z jiného procesu)
+            with app.app_context():
+                resume_import_jobs()
+                resume_reoptimize_jobs()
+            continue
+        try:
+            with app.app_context():
+                runner(job_id)
+        except Exception as e:
+            print(f"Job {runner.__name__} {job_id} selhal: {e}")
+        finally:
+            _import_queue.task_done()
+
+def _enqueue_background(runner, job_id):
+    global _import_worker
+    if BACKGROUND_JOBS_MODE == 'inline':
+        runner(job_id)
+        return
+    if BACKGROUND_JOBS_MODE == 'scheduled':
+        return  # Job zůstane ve frontě v DB pro `flask run-jobs`
+    with _import_worker_lock:
+        if _import_worker is None or not _import_worker.is_alive():
+            _import_worker = threading.Thread(target=_import_worker_loop, name='import-worker', daemon=True)
+            _import_worker.start()
+    _import_queue.put((runner, job_id))
+
+def enqueue_import_job(job_id):
+    """Zařadí job do fronty a případně spustí worker thread"""
+    _enqueue_background(run_import_job, job_id)
+
+def resume_import_jobs(runner=None):
+    """Znovu zařadí čekající a přerušené importy (po restartu aplikace), s `runner` je rovnou spustí"""
+    stale_before = datetime.utcnow() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    ImportJob.query.filter(
+        ImportJob.phase.in_(IMPORT_JOB_RUNNING),
+        ImportJob.updated_at < stale_before
+    ).update({'phase': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    for job_id in [job.id for job in ImportJob.query.filter_by(phase='queued').order_by(ImportJob.id)]:
+        (runner or enqueue_import_job)(job_id)
+
+def find_revised_import(job):
+    """Import, který delta job reviduje - zvolený, jinak poslední import stejně pojmenovaného souboru v zakázce"""
+    if job.revises_file_id:
+        previous_file = db.session.get(ImportedFile, job.revises_file_id)
+    else:
+        previous_file = ImportedFile.query.filter_by(order_id=job.order_id, filename=job.filename) \
+            .order_by(ImportedFile.uploaded_at.desc(), ImportedFile.id.desc()).first()
+    if previous_file is None or previous_file.order_id != job.order_id:
+        raise ValueError(f'V zakázce není předchozí import souboru "{job.filename}" - zvolte revidovaný import')
+    has_pallets = db.session.query(
+        PalletItem.query.filter_by(order_id=job.order_id, imported_file_id=previous_file.id).exists()
+    ).scalar()
+    if not has_pallets:
+        # Palety importované před evidencí zdroje nejde bezpečně odlišit od ostatních
+        raise ValueError(f'Palety importu "{previous_file.filename}" nemají evidovaný zdroj, revizi nelze porovnat - importujte soubor jako nový')
+    return previous_file
+
+def _keep_import_claim(job_id, token):
+    """Obnoví updated_at jobu v aktuální transakci - jen pokud ho pořád drží tento běh"""
+    table = ImportJob.__table__
+    kept = db.session.execute(
+        table.update().where(table.c.id == job_id, table.c.claim_token == token).values(updated_at=datetime.utcnow())
+    ).rowcount
+    if not kept:
+        raise ImportJobLost(job_id)
+
+def run_import_job(job_id):
+    """Provede import parse -> insert -> auto-assign a průběžně ukládá stav jobu.
+
+    Před každým commitem se ověří, že job drží pořád tento běh - job, který
+    resume_import_jobs mezitím vrátil do fronty jako přerušený, dokončí jen
+    nový běh a původní své změny zahodí.
+    """
+    # Atomické převzetí jobu - stejný job nezpracujeme dvakrát
+    token = secrets.token_hex(8)
+    claimed = ImportJob.query.filter_by(id=job_id, phase='queued').update(
+        {'phase': 'parsing', 'claim_token': token, 'updated_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return
+    
+    job = db.session.get(ImportJob, job_id)
+    try:
+        # Pokud už jsou palety vložené (restart po fázi insert), pokračujeme přiřazením
+        imported_file = ImportedFile.query.filter_by(file_hash=job.file_hash).first()
+        if imported_file is not None:
+            if imported_file.order_id != job.order_id:
+                raise ValueError(f'Tento soubor už byl importován do zakázky "{imported_file.order.name}"')
+            job.pallets_imported = imported_file.rows_imported
+        else:
+            def report_progress(rows_done):
+                job.rows_processed = rows_done
+                _keep_import_claim(job_id, token)
+                db.session.commit()
+            
+            batch = build_pallet_batch(
+                read_import_rows(job.stored_path, job.filename, job.profile),
+                progress=report_progress
+            )
+            if len(batch) == 0:
+                raise ValueError('Excel does not contain any valid pallet rows')
+            
+            previous_file = find_revised_import(job) if job.mode == 'delta' else None
+            job.phase = 'inserting'
+            _keep_import_claim(job_id, token)
+            db.session.commit()
+            
+            # Palety, záznam ImportedFile i posun fáze v jedné transakci
+            imported_file = ImportedFile(filename=job.filename, file_hash=job.file_hash, order_id=job.order_id)
+            db.session.add(imported_file)
+            db.session.flush()
+            summary = {}
+            if job.mode == 'delta':
+                summary = delta_import_pallets(job.order_id, batch, previous_file.id, imported_file.id)
+                summary['revises'] = previous_file.filename
+                rows_imported = summary['inserted']
+            else:
+                rows_imported = bulk_insert_pallets(job.order_id, batch, imported_file.id)
+            # Podíl textových délek vyřešených bez nového parsování (opakovaný text v dávce)
+            length_stats = dict(batch.length_stats)
+            if length_stats.get('texts'):
+                length_stats['hit_rate'] = round(1 - length_stats['unique_texts'] / length_stats['texts'], 3)
+            summary['length_parsing'] = length_stats
+            job.summary = json.dumps(summary)
+            imported_file.rows_imported = rows_imported
+            job.pallets_imported = rows_imported
+        
+        # Delta import zachovává stávající lanes, auto-assign se nespouští
+        if job.mode != 'delta':
+            job.phase = 'assigning'
+            _keep_import_claim(job_id, token)
+            db.session.commit()
+            plan = auto_assign_lanes(job.order_id)
+            if plan is not None:
+                summary = json.loads(job.summary) if job.summary else {}
+                summary['lanes'] = plan.to_dict()
+                job.summary = json.dumps(summary)
+        job.phase = 'done'
+        _keep_import_claim(job_id, token)
+        db.session.commit()
+    except ImportJobLost:
+        db.session.rollback()
+        return  # Uložený soubor potřebuje běh, který job převzal
+    except Exception as e:
+        db.session.rollback()
+        failed = ImportJob.query.filter_by(id=job_id, claim_token=token).update(
+            {'phase': 'failed', 'error': str(e)}, synchronize_session=False
+        )
+        db.session.commit()
+        if not failed:
+            return
+        job = db.session.get(ImportJob, job_id)
+    
+    if job.stored_path and os.path.exists(job.stored_path):
+        os.remove(job.stored_path)
+
+# Hromadné přepočítání lanes - výpočet v procesním poolu, zápis jen změněných palet
+REOPTIMIZE_POOL_MIN_ORDERS = 8   # Pod tímto počtem zakázek se pool nevyplatí
+REOPTIMIZE_BATCH_ORDERS = 32     # Zakázek na jednu dávku výpočtu / průběžný commit
 
-Zakázka: {order.name}
-Vytvořeno: {order.created_at.strftime('%d.%m.%Y %H:%M')}
-Dopravce: {order.carrier_name or 'neuvedeno'}
-Nakládka: {order.pickup_datetime.strftime('%d.%m.%Y %H:%M') if order.pickup_datetime else 'neuvedeno'}
-Kamion: {order.truck_license_plate or 'neuvedeno'}
+def enqueue_reoptimize_job(trigger='manual', strategy=None, capacity_m=None, previous_capacity_m=None):
+    """Založí ReoptimizeJob a zařadí ho do fronty úloh na pozadí. Vrací job."""
+    job = ReoptimizeJob(
+        trigger=trigger,
+        strategy=strategy if strategy in LANE_STRATEGIES else None,
+        capacity_m=capacity_m,
+        previous_capacity_m=previous_capacity_m,
+    )
+    db.session.add(job)
+    db.session.commit()
+    _enqueue_background(run_reoptimize_job, job.id)
+    return job
 
-Detaily naleznete v příloze.
+def resume_reoptimize_jobs(runner=None):
+    """Znovu zařadí čekající a přerušené přepočty (po restartu aplikace), s `runner` je rovnou spustí"""
+    stale_before = datetime.utcnow() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    ReoptimizeJob.query.filter(
+        ReoptimizeJob.phase == 'running',
+        ReoptimizeJob.updated_at < stale_before
+    ).update({'phase': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    for job_id in [job.id for job in ReoptimizeJob.query.filter_by(phase='queued').order_by(ReoptimizeJob.id)]:
+        if runner is not None:
+            runner(job_id)
+        else:
+            _enqueue_background(run_reoptimize_job, job_id)
 
-S pozdravem,
-Hueppe systém
-"""
-        
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
-        
-        # Create CSV attachment
-        csv_data = "lsa,pallet_text,length_m,assigned_lane,weight\n"
-        for it in order.items:
-            csv_data += f'{it.lsa},{it.pallet_text},{it.length_m},{it.assigned_lane},{it.weight}\n'
-        
-        attachment = MIMEBase('application', 'octet-stream')
-        attachment.set_payload(csv_data.encode('utf-8'))
-        encoders.encode_base64(attachment)
-        attachment.add_header('Content-Disposition', f'attachment; filename="order_{order.id}.csv"')
-        msg.attach(attachment)
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Zpracuje čekající a přerušené importy a přepočty lanes (naplánovaná úloha místo threadu)"""
+    resume_import_jobs(run_import_job)
+    resume_reoptimize_jobs(run_reoptimize_job)
+
+def _reoptimize_plan(strategy, arrays, lane_capacity_cm):
+    # Spouští se i v podprocesu poolu - jen výpočet, bez DB
+    return run_lane_strategy(strategy, arrays, lane_capacity_cm)
+
+def _current_lane_totals(arrays):
+    lanes = arrays.assigned_lane if arrays.assigned_lane is not None else np.zeros(len(arrays), dtype=np.int64)
+    return (np.bincount(lanes, weights=arrays.length_cm, minlength=LANE_COUNT + 1)[1:LANE_COUNT + 1] / 100.0).tolist()
+
+def _compute_plans(tasks, executor):
+    """Plány pro [(strategie, arrays, kapacita_cm)] - přes cache, chybějící v poolu (pokud je)"""
+    plans = [None] * len(tasks)
+    missing = []
+    for pos, (strategy, arrays, capacity_cm) in enumerate(tasks):
+        key = (arrays.fingerprint(), strategy, capacity_cm, None, LANE_COUNT)
+        plan = LANE_PLAN_CACHE.get(key)
+        if plan is not None:
+            plans[pos] = plan.copy()
+            plans[pos].cached = True
+        else:
+            missing.append((pos, key))
+    if executor is not None and len(missing) > 1:
+        results = executor.map(_reoptimize_plan, *zip(*[tasks[pos] for pos, _ in missing]))
+    else:
+        results = (_reoptimize_plan(*tasks[pos]) for pos, _ in missing)
+    for (pos, key), plan in zip(missing, results):
+        cache_lane_plan(key, plan)
+        plans[pos] = plan
+    return plans
+
+def run_reoptimize_job(job_id):
+    """Přepočítá lanes aktivních zakázek a uloží report před/po.
+
+    Aktivní jsou otevřené zakázky, které nejsou uložené na později (jako na
+    seznamu zakázek), bez zakázky "Vyřazené z nakládky". Zakázky, které se už
+    nakládají (is_loaded nebo naložené palety), se přeskočí. Výpočet běží po
+    dávkách v procesním poolu, zápis v tomto vlákně - před zápisem se ověří,
+    že se palety zakázky mezitím nezměnily.
+    """
+    claimed = ReoptimizeJob.query.filter_by(id=job_id, phase='queued').update(
+        {'phase': 'running', 'updated_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return
+    
+    job = db.session.get(ReoptimizeJob, job_id)
+    executor = None
+    try:
+        report = json.loads(job.report) if job.report else []
+        done_ids = {entry['order_id'] for entry in report}
+        
+        # Nová výchozí kapacita pro zakázky, které měly původní výchozí
+        if job.capacity_m and job.previous_capacity_m is not None:
+            Order.query.filter(
+                Order.closed == False,
+                db.or_(Order.is_loaded == False, Order.is_loaded.is_(None)),
+                Order.capacity_m == job.previous_capacity_m
+            ).update({'capacity_m': job.capacity_m, 'version': Order.version + 1}, synchronize_session=False)
+            db.session.commit()
         
-        # Send email
-        server = smtplib.SMTP(smtp_config['host'], smtp_config.get('port', 587))
-        if smtp_config.get('use_tls', True):
-            server.starttls()
-        server.login(smtp_config['username'], smtp_config['password'])
-        server.send_message(msg)
-        server.quit()
+        orders = Order.query.filter(
+            Order.closed == False,
+            db.or_(Order.saved_for_later == False, Order.saved_for_later.is_(None)),
+            Order.name != 'Vyřazené z nakládky'
+        ).order_by(Order.id).all()
+        job.orders_total = len(orders)
+        db.session.commit()
+        orders = [order for order in orders if order.id not in done_ids]
         
-        return True
+        if len(orders) >= REOPTIMIZE_POOL_MIN_ORDERS:
+            try:
+                # spawn - fork procesu s běžícími thready (Flask, pool spojení, fronta) může zamrznout
+                executor = ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, 4),
+                                               mp_context=multiprocessing.get_context('spawn'))
+            except (OSError, NotImplementedError) as e:
+                print(f"Procesní pool není dostupný, přepočet poběží sekvenčně: {e}")
+        
+        loading_order_ids = {
+            order_id for (order_id,) in db.session.query(PalletItem.order_id).filter(PalletItem.loaded == True).distinct()
+        }
+        for start in range(0, len(orders), REOPTIMIZE_BATCH_ORDERS):
+            batch = []
+            for order in orders[start:start + REOPTIMIZE_BATCH_ORDERS]:
+                entry = {'order_id': order.id, 'name': order.name}
+                report.append(entry)  # Report v pořadí zakázek, výsledek se doplní níž
+                if order.is_loaded or order.id in loading_order_ids:
+                    entry['skipped'] = 'nakládka už probíhá'
+                    continue
+                arrays = LaneArrays.load(order.id)
+                if not len(arrays):
+                    entry['skipped'] = 'bez palet'
+                    continue
+                strategy = job.strategy or resolve_lane_strategy(order)
+                capacity_cm = int(round((order.capacity_m or DEFAULT_LANE_CAPACITY) * 100))
+                batch.append((entry, (strategy, arrays, capacity_cm)))
+            
+            plans = _compute_plans([task for _, task in batch], executor)
+            for (entry, (strategy, arrays, capacity_cm)), plan in zip(batch, plans):
+                order_id = entry['order_id']
+                if LaneArrays.load(order_id).fingerprint() != arrays.fingerprint():
+                    entry['skipped'] = 'palety se během přepočtu změnily'
+                    continue
+                before = _current_lane_totals(arrays)
+                before_quality = plan_quality(before, capacity_cm / 100.0)
+                changed = write_lane_vector(arrays, plan.lanes)
+                mark_order_aggregates([order_id])
+                entry.update({
+                    'strategy': strategy,
+                    'pallets': len(arrays),
+                    'pallets_changed': changed,
+                    'before': {'lane_totals': [round(total, 2) for total in before], 'fits': before_quality['fits'], 'overflow_m': before_quality['overflow_m']},
+                    'after': {'lane_totals': [round(total, 2) for total in plan.lane_totals], 'fits': plan.quality['fits'], 'overflow_m': plan.quality['overflow_m']},
+                })
+                if changed:
+                    job.orders_changed = (job.orders_changed or 0) + 1
+                    job.pallets_changed = (job.pallets_changed or 0) + changed
+            
+            job.orders_done = len(report)
+            job.report = json.dumps(report, ensure_ascii=False)
+            db.session.commit()
         
+        job.phase = 'done'
+        db.session.commit()
     except Exception as e:
-        flash(f'Chyba při odesílání e-mailu: {str(e)}', 'danger')
-        return False
+        db.session.rollback()
+        job = db.session.get(ReoptimizeJob, job_id)
+        job.phase = 'failed'
+        job.error = str(e)
+        db.session.commit()
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+@app.route('/reoptimize_orders', methods=['POST'])
+def reoptimize_orders():
+    """Spustí přepočet lanes všech otevřených zakázek na pozadí"""
+    data = request.get_json(silent=True) or request.form
+    job = enqueue_reoptimize_job('manual', data.get('strategy') or None)
+    if wants_json_response():
+        return jsonify({'success': True, 'job': job.to_dict()}), 202
+    flash('Přepočet lanes otevřených zakázek běží na pozadí.', 'info')
+    return redirect(url_for('reoptimize_job_view', job_id=job.id))
 
-@app.route('/loading_orders')
-def loading_orders():
-    # Zobrazí pouze aktivní zakázky (nedelivered)
-    orders = Order.query.filter_by(delivered=False).order_by(Order.created_at.desc()).all()
-    return render_template('loading_orders.html', orders=orders)
+@app.route('/reoptimize_jobs/<int:job_id>')
+def reoptimize_job_view(job_id):
+    """Průběh a report přepočtu (JSON pro fetch, jinak stránka)"""
+    job = db.session.get(ReoptimizeJob, job_id)
+    if not job and wants_json_response():
+        return jsonify({'success': False, 'error': 'Přepočet nenalezen'}), 404
+    job = job or ReoptimizeJob.query.get_or_404(job_id)
+    if wants_json_response():
+        return jsonify({'success': True, 'job': job.to_dict()})
+    return render_template('reoptimize_job.html', job=job.to_dict(), lane_strategies=LANE_STRATEGIES)
 
-@app.route('/archive')
-def archive():
-    """Archiv doručených zakázek"""
-    delivered_orders = Order.query.filter_by(delivered=True).order_by(Order.created_at.desc()).all()
-    return render_template('archive.html', orders=delivered_orders)
+def wants_json_response():
+    """True pokud klient (fetch/XHR) preferuje JSON před HTML"""
+    return request.accept_mimetypes.best == 'application/json'
 
-@app.route('/create_order', methods=['POST'])
-def create_order():
-    name = request.form.get('name') or f'Order {datetime.utcnow().isoformat()}'
-    order = Order(name=name)
-    db.session.add(order)
-    db.session.commit()
-    return redirect(url_for('order_view', order_id=order.id))
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    message = f'Nahrávaná data jsou větší než povolený limit {limit_mb} MB'
+    if wants_json_response():
+        return jsonify({'success': False, 'error': message}), 413
+    flash(message, 'danger')
+    return redirect(request.referrer or url_for('index'))
 
-@app.route('/order/<int:order_id>')
-def order_view(order_id):
-    order = Order.query.get_or_404(order_id)
-    # lane totals
-    lane_totals = {1:0.0,2:0.0,3:0.0}
-    total_weight = 0.0
-    for it in order.items:
-        if it.assigned_lane in (1,2,3):
-            lane_totals[it.assigned_lane] += it.length_m
-        total_weight += it.weight
-    # compute pallet places
-    sum_cols = lane_totals[1] + lane_totals[2] + lane_totals[3]
-    pallet_places = 0.0
-    if sum_cols > 0:
-        pallet_places = round((sum_cols / 3.0) / 0.4, 2)
-    price = round(pallet_places * order.price_per_place, 2)
-    is_full = price >= order.full_truck_price
-    if is_full:
-        price = order.full_truck_price
-    
-    # Vytvoříme správně seřazené položky podle LSA skupin pro vizualizaci
-    from collections import OrderedDict
-    
-    # Pro každou lane vytvoříme správně seřazenou sekvenci
-    sorted_items_by_lane = {1: [], 2: [], 3: []}
-    
-    # Seskupíme všechny položky podle LSA
-    all_items = list(order.items)
-    all_items.sort(key=lambda x: x.import_order)  # Zachováme původní pořadí importu
-    
-    lsa_groups = OrderedDict()
-    for item in all_items:
-        lsa_code = item.lsa or 'NO_LSA'
-        if lsa_code not in lsa_groups:
-            lsa_groups[lsa_code] = []
-        lsa_groups[lsa_code].append(item)
-    
-    # Pro každou lane seřadíme položky podle LSA skupin
-    for lane in [1, 2, 3]:
-        lane_items = []
-        for lsa_code, items in lsa_groups.items():
-            # Přidáme položky z této LSA skupiny, které patří do aktuální lane
-            lane_group_items = [item for item in items if item.assigned_lane == lane]
-            lane_items.extend(lane_group_items)
-        sorted_items_by_lane[lane] = lane_items
-    
-    # Generate LSA summary for closed orders
-    lsa_summary = generate_lsa_summary(order) if order.closed else {}
-    
-    return render_template('order.html', order=order, lane_totals=lane_totals, pallet_places=pallet_places, price=price, is_full=is_full, total_weight=total_weight, lsa_summary=lsa_summary, sorted_items_by_lane=sorted_items_by_lane)
+@app.route('/import_jobs/<int:job_id>')
+def import_job_status(job_id):
+    """Stav importu na pozadí (fáze, zpracované řádky, chyba)"""
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Import nenalezen'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 @app.route('/upload/<int:order_id>', methods=['GET','POST'])
 def upload(order_id):
@@ -646,98 +2907,407 @@ def upload(order_id):
         if not file:
             flash('Please upload a file', 'warning')
             return redirect(url_for('order_view', order_id=order_id))
+        profile = request.form.get('profile') or None
+        if not is_known_import_profile(profile):
+            flash(f'Neznámý importní profil "{profile}"', 'warning')
+            return redirect(url_for('upload', order_id=order_id))
         
-        # Read file content and calculate hash
-        file_content = file.read()
-        file_hash = calculate_file_hash(file_content)
-        
-        # Check if file was already imported
-        existing_file = ImportedFile.query.filter_by(file_hash=file_hash).first()
-        if existing_file:
-            flash(f'Tento soubor už byl importován do zakázky "{existing_file.order.name}" dne {existing_file.uploaded_at.strftime("%d.%m.%Y %H:%M")}', 'warning')
-            return redirect(url_for('order_view', order_id=order_id))
-        
-        # Reset file pointer for pandas
-        file.seek(0)
-        
-        # Read excel with pandas
+        # Jeden průchod: uložení do dočasného souboru + SHA-256
         try:
-            df = pd.read_excel(file, header=None, engine='openpyxl')
-        except Exception as e:
-            flash(f'Failed to read Excel file: {e}', 'danger')
-            return redirect(url_for('order_view', order_id=order_id))
-        # We want rows from row index 2 (3rd row) and columns 0..5 (A..F)
-        if df.shape[0] < 3:
-            flash('Excel does not contain enough rows', 'warning')
+            spooled_path, file_hash, _ = spool_upload(file.stream, IMPORT_JOBS_DIR)
+        except UploadTooLarge as e:
+            flash(str(e), 'danger')
             return redirect(url_for('order_view', order_id=order_id))
-        df_sub = df.iloc[2:, 0:9].copy()  # Rozšířeno na 9 sloupců (A-I)
-        rows_imported = 0
         
-        # columns: date, lsa_designation, lsa, pallet_text, qty, weight, length1, length2, length3
-        import_order_counter = 0
-        for _, row in df_sub.iterrows():
-            try:
-                date_received = str(row[0]).strip() if not pd.isna(row[0]) else ''    # Sloupec A - datum
-                lsa_designation = str(row[1]).strip() if not pd.isna(row[1]) else ''  # Sloupec B
-                lsa = str(row[2]).strip() if not pd.isna(row[2]) else ''             # Sloupec C
-                pallet_text = str(row[3]).strip() if not pd.isna(row[3]) else ''     # Sloupec D
-                qty = int(row[4]) if not pd.isna(row[4]) else 1                      # Sloupec E
-                weight = float(row[5]) if not pd.isna(row[5]) else 0.0               # Sloupec F
-                
-                # Skutečné délky ze sloupců G, H, I (místo parsování z textu)
-                length_g = float(row[6]) if not pd.isna(row[6]) and str(row[6]).replace('.','').replace(',','').isdigit() else 0.0  # Sloupec G
-                length_h = float(row[7]) if not pd.isna(row[7]) and str(row[7]).replace('.','').replace(',','').isdigit() else 0.0  # Sloupec H  
-                length_i = float(row[8]) if not pd.isna(row[8]) and str(row[8]).replace('.','').replace(',','').isdigit() else 0.0  # Sloupec I
-                
-                # Vybereme první nenulovou délku (G -> H -> I -> fallback na parsing)
-                if length_g > 0:
-                    length_m = length_g
-                elif length_h > 0:
-                    length_m = length_h
-                elif length_i > 0:
-                    length_m = length_i
-                else:
-                    length_m = parse_length_from_text(pallet_text)  # Fallback na starý způsob
-                    
-            except Exception:
-                continue
-            # Expand by qty -> create separate PalletItem rows per pallet
-            for i in range(max(1, qty)):
-                import_order_counter += 1
-                it = PalletItem(
-                    order_id=order.id, 
-                    date_received=date_received,
-                    lsa=lsa, 
-                    lsa_designation=lsa_designation,
-                    pallet_text=pallet_text, 
-                    qty=1, 
-                    weight=weight / max(1, qty), 
-                    length_m=length_m,
-                    import_order=import_order_counter
-                )
-                db.session.add(it)
-                rows_imported += 1
-        
-        # Save imported file record
-        imported_file = ImportedFile(
-            filename=file.filename,
-            file_hash=file_hash,
-            order_id=order.id,
-            rows_imported=rows_imported
-        )
-        db.session.add(imported_file)
+        # Soubor už byl importován nebo se právě importuje na pozadí
+        duplicate = import_duplicate_message(file_hash)
+        if duplicate:
+            os.remove(spooled_path)
+            flash(duplicate, 'warning')
+            return redirect(url_for('order_view', order_id=order_id))
         
+        # Předáme uložený soubor workeru na pozadí
+        mode = 'delta' if request.form.get('mode') == 'delta' else 'full'
+        revises_file_id = request.form.get('revises_file_id', type=int) if mode == 'delta' else None
+        job = create_import_job(order.id, file.filename, spooled_path, file_hash,
+                                mode=mode, profile=profile, revises_file_id=revises_file_id)
         db.session.commit()
+        enqueue_import_job(job.id)
         
-        # Auto-assign pallets to lanes after import
-        auto_assign_lanes(order_id)
+        if wants_json_response():
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'status_url': url_for('import_job_status', job_id=job.id)
+            }), 202
         
-        flash(f'Imported {rows_imported} pallets from "{file.filename}" and auto-assigned to lanes.', 'success')
+        if mode == 'delta':
+            flash(f'Revize souboru "{file.filename}" se zpracovává na pozadí, stávající přiřazení lanes zůstane zachováno.', 'info')
+        else:
+            flash(f'Import souboru "{file.filename}" běží na pozadí, palety se po dokončení automaticky přiřadí do lanes.', 'info')
         return redirect(url_for('order_view', order_id=order_id))
+    imported_files = ImportedFile.query.filter_by(order_id=order.id).order_by(ImportedFile.uploaded_at.desc()).all()
+    return render_template('upload.html', order=order, import_profiles=get_import_profiles(), imported_files=imported_files)
+
+# Hromadný import více souborů / ZIP archivu - každý soubor je samostatný ImportJob
+def spool_batch_uploads(pairs):
+    """Uloží nahrané soubory (.xlsx/.csv i členy .zip) na disk a spočítá jejich hashe.
+
+    `pairs` jsou dvojice (soubor, id_zakázky). Vrací seznam slovníků
+    (filename, path, file_hash, order_id) v pořadí nahrání.
+    """
+    uploads = []
+    try:
+        for file, order_id in pairs:
+            if file.filename.lower().endswith('.zip'):
+                with zipfile.ZipFile(file.stream) as archive:
+                    # Členy archivu v abecedním pořadí, bez složek a metadat macOS
+                    for name in sorted(archive.namelist()):
+                        if name.endswith('/') or name.startswith('__MACOSX/') or not name.lower().endswith(IMPORT_EXTENSIONS):
+                            continue
+                        with archive.open(name) as member:
+                            path, file_hash, _ = spool_upload(member, IMPORT_JOBS_DIR)
+                        uploads.append({'filename': os.path.basename(name), 'path': path, 'file_hash': file_hash, 'order_id': order_id})
+            else:
+                path, file_hash, _ = spool_upload(file.stream, IMPORT_JOBS_DIR)
+                uploads.append({'filename': file.filename, 'path': path, 'file_hash': file_hash, 'order_id': order_id})
+    except BaseException:
+        remove_spooled_uploads(uploads)
+        raise
+    return uploads
+
+def remove_spooled_uploads(uploads):
+    for upload in uploads:
+        if os.path.exists(upload['path']):
+            os.remove(upload['path'])
+
+def pair_batch_files(files, order_ids):
+    """Spáruje soubory s cílovými zakázkami ještě před vyřazením prázdných polí.
+
+    Jedna zakázka platí pro všechny soubory, jinak musí počty sedět. Vrací
+    (dvojice (soubor, id_zakázky), chyba).
+    """
+    if len(order_ids) == 1:
+        order_ids = order_ids * len(files)
+    if len(order_ids) != len(files):
+        return [], f'Počet cílových zakázek ({len(order_ids)}) neodpovídá počtu souborů ({len(files)})'
+    pairs = []
+    for file, order_id in zip(files, order_ids):
+        if not file or not file.filename:
+            continue
+        try:
+            pairs.append((file, int(order_id)))
+        except (TypeError, ValueError):
+            return [], f'Chybí cílová zakázka pro soubor "{file.filename}"'
+    return pairs, None
+
+def import_duplicate_message(file_hash):
+    """Důvod, proč soubor nelze importovat (už importovaný / právě se importuje), jinak None"""
+    existing_file = ImportedFile.query.filter_by(file_hash=file_hash).first()
+    if existing_file:
+        return f'Tento soubor už byl importován do zakázky "{existing_file.order.name}" dne {existing_file.uploaded_at.strftime("%d.%m.%Y %H:%M")}'
+    pending_job = ImportJob.query.filter(
+        ImportJob.file_hash == file_hash,
+        ImportJob.phase.notin_(IMPORT_JOB_FINISHED)
+    ).first()
+    if pending_job:
+        return f'Tento soubor se právě importuje do zakázky "{pending_job.order.name}"'
+    return None
+
+def create_import_job(order_id, filename, spooled_path, file_hash, **options):
+    """Založí ImportJob a přesune do něj uložený upload (commit, zařazení do fronty nechává na volajícím)"""
+    job = ImportJob(order_id=order_id, filename=filename, file_hash=file_hash, **options)
+    db.session.add(job)
+    db.session.flush()
+    extension = os.path.splitext(filename)[1].lower() or '.xlsx'
+    job.stored_path = os.path.join(IMPORT_JOBS_DIR, f'{job.id}_{file_hash}{extension}')
+    os.replace(spooled_path, job.stored_path)
+    return job
+
+def queue_batch_uploads(uploads, profile_name=None):
+    """Založí ImportJob pro každý soubor dávky (duplikáty přeskočí) a vrátí souhrn po souborech"""
+    seen_hashes = set()
+    results = []
+    jobs = []
+    for upload in uploads:
+        result = {'filename': upload['filename'], 'order_id': upload['order_id'], 'status': 'queued', 'job_id': None, 'message': ''}
+        results.append(result)
+        if upload['file_hash'] in seen_hashes:
+            duplicate = 'Stejný soubor je v dávce vícekrát'
+        else:
+            duplicate = import_duplicate_message(upload['file_hash'])
+        seen_hashes.add(upload['file_hash'])
+        if duplicate:
+            os.remove(upload['path'])
+            result.update(status='duplicate', message=duplicate)
+            continue
+        job = create_import_job(upload['order_id'], upload['filename'], upload['path'], upload['file_hash'], profile=profile_name)
+        jobs.append(job)
+        result['job_id'] = job.id
+        result['message'] = 'Import běží na pozadí'
+    db.session.commit()
+    for job in jobs:
+        enqueue_import_job(job.id)
+    return results
+
+@app.route('/batch_upload', methods=['GET', 'POST'])
+def batch_upload():
+    """Hromadný import více .xlsx/.csv souborů nebo ZIP archivu do jedné či více zakázek"""
+    if request.method == 'POST':
+        pairs, error = pair_batch_files(request.files.getlist('files'), request.form.getlist('order_id'))
+        order_ids = sorted({order_id for _, order_id in pairs})
+        profile = request.form.get('profile') or None
+        
+        if error is None:
+            if not pairs:
+                error = 'Please upload a file'
+            elif not is_known_import_profile(profile):
+                error = f'Neznámý importní profil "{profile}"'
+            else:
+                found = {order.id for order in Order.query.filter(Order.id.in_(order_ids)).all()}
+                missing = sorted(set(order_ids) - found)
+                if missing:
+                    error = f'Zakázka {missing[0]} neexistuje'
         
-        flash('Imported pallets into order (expanded by quantity) and auto-assigned to lanes.', 'success')
-        return redirect(url_for('order_view', order_id=order_id))
-    return render_template('upload.html', order=order)
+        uploads = []
+        if error is None:
+            try:
+                uploads = spool_batch_uploads(pairs)
+            except zipfile.BadZipFile as e:
+                error = f'Nevalidní ZIP archiv: {e}'
+            except UploadTooLarge as e:
+                error = str(e)
+            else:
+                if not uploads:
+                    error = 'V dávce nejsou žádné .xlsx ani .csv soubory'
+        
+        if error:
+            if wants_json_response():
+                return jsonify({'success': False, 'error': error}), 400
+            flash(error, 'warning')
+            return redirect(url_for('batch_upload', order_id=order_ids[0] if order_ids else None))
+        
+        try:
+            results = queue_batch_uploads(uploads, profile)
+        except BaseException:
+            db.session.rollback()
+            remove_spooled_uploads(uploads)
+            raise
+        if wants_json_response():
+            return jsonify({
+                'success': True,
+                'results': [
+                    dict(result, status_url=url_for('import_job_status', job_id=result['job_id']) if result['job_id'] else None)
+                    for result in results
+                ],
+                'queued_files': sum(1 for result in results if result['status'] == 'queued'),
+            }), 202
+        orders = Order.query.filter(Order.id.in_({result['order_id'] for result in results})).all()
+        return render_template('batch_upload.html', results=results, orders={order.id: order for order in orders})
+    
+    open_orders = Order.query.filter_by(closed=False).order_by(Order.created_at.desc()).all()
+    return render_template(
+        'batch_upload.html',
+        open_orders=open_orders,
+        selected_order_id=request.args.get('order_id', type=int),
+        import_profiles=get_import_profiles()
+    )
+
+# Náhled importu - nahraný soubor a popis náhledu (zakázka, profil) leží na disku
+# pod hashem souboru, takže potvrzení funguje i v jiném WSGI workeru. Zparsovaná
+# dávka se navíc drží v paměti procesu, aby potvrzení nemuselo Excel číst znovu.
+IMPORT_PREVIEW_DIR = os.path.join(IMPORT_JOBS_DIR, 'previews')
+IMPORT_PREVIEW_TTL_SECONDS = 15 * 60
+IMPORT_PREVIEW_CACHE = TTLCache(
+    max_entries=20,
+    ttl_seconds=IMPORT_PREVIEW_TTL_SECONDS,
+    max_size=200000,  # Celkový počet palet držených v paměti
+    sizeof=lambda entry: len(entry[1])
+)
+
+def _import_preview_meta_path(file_hash):
+    return os.path.join(IMPORT_PREVIEW_DIR, f'{file_hash}.json')
+
+def save_import_preview(file_hash, spooled_path, filename, profile, order_id):
+    """Přesune upload mezi náhledy a zapíše k němu popis (přepíše starší náhled téhož souboru)"""
+    os.makedirs(IMPORT_PREVIEW_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower() or '.xlsx'
+    stored_path = os.path.join(IMPORT_PREVIEW_DIR, f'{file_hash}{extension}')
+    os.replace(spooled_path, stored_path)
+    meta = {
+        'filename': filename,
+        'profile': profile,
+        'order_id': order_id,
+        'stored_path': stored_path,
+        'created_at': time.time(),
+    }
+    meta_path = _import_preview_meta_path(file_hash)
+    with open(meta_path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + '.part', meta_path)
+    return meta
+
+def load_import_preview(file_hash):
+    """Popis náhledu podle hashe souboru, None když neexistuje nebo vypršel"""
+    if not file_hash or not re.fullmatch(r'[0-9a-f]{64}', file_hash):
+        return None
+    try:
+        with open(_import_preview_meta_path(file_hash), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - meta['created_at'] > IMPORT_PREVIEW_TTL_SECONDS or not os.path.exists(meta['stored_path']):
+        discard_import_preview(file_hash, meta)
+        return None
+    return meta
+
+def discard_import_preview(file_hash, meta=None):
+    """Smaže náhled z disku i z paměti procesu"""
+    IMPORT_PREVIEW_CACHE.pop(file_hash)
+    paths = [_import_preview_meta_path(file_hash)]
+    if meta:
+        paths.append(meta['stored_path'])
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def prune_import_previews():
+    """Uklidí vypršelé náhledy, ke kterým nikdo nepotvrdil import"""
+    if not os.path.isdir(IMPORT_PREVIEW_DIR):
+        return
+    for name in os.listdir(IMPORT_PREVIEW_DIR):
+        if name.endswith('.json'):
+            load_import_preview(name[:-len('.json')])
+
+def import_preview_batch(file_hash, meta):
+    """Zparsovaná dávka náhledu - z paměti procesu, jinak znovu ze souboru na disku"""
+    cached = IMPORT_PREVIEW_CACHE.get(file_hash)
+    if cached is not None and cached[0] == meta['profile']:
+        return cached[1]
+    batch = build_pallet_batch(read_import_rows(meta['stored_path'], meta['filename'], meta['profile']))
+    IMPORT_PREVIEW_CACHE.put(file_hash, (meta['profile'], batch))
+    return batch
+
+def build_import_preview(order, batch):
+    """Souhrn dávky a simulované auto-assign (stávající + nové palety) bez zápisu do DB"""
+    table = PalletItem.__table__
+    existing = db.session.execute(
+        db.select(table.c.lsa, table.c.length_m)
+        .where(table.c.order_id == order.id)
+        .order_by(table.c.import_order)
+    ).all()
+    new_pallets = [(batch.lsa[src], length_m) for src, length_m in zip(batch.row_index.tolist(), batch.length_m.tolist())]
+    pallets = [(row.lsa, row.length_m) for row in existing] + new_pallets
+    
+    lane_totals = run_lane_strategy(
+        resolve_lane_strategy(order),
+        LaneArrays.from_pallets(pallets),
+        int(round((order.capacity_m or DEFAULT_LANE_CAPACITY) * 100))
+    ).lane_totals
+    pallet_places, price, is_full = compute_pallet_price(lane_totals, order.price_per_place, order.full_truck_price)
+    
+    existing_lsa = set(row.lsa for row in existing)
+    batch_lsa = set(lsa for lsa, _ in new_pallets)
+    return {
+        'source_rows': batch.source_rows,
+        'pallets': len(batch),
+        'lsa_groups': len(batch_lsa),
+        'new_lsa_groups': len(batch_lsa - existing_lsa),
+        'total_length_m': round(float(batch.length_m.sum()), 2),
+        'total_weight': round(float(batch.weight.sum()), 1),
+        'lane_totals': {lane: round(total, 2) for lane, total in zip((1, 2, 3), lane_totals)},
+        'pallet_places': pallet_places,
+        'price': price,
+        'is_full': is_full,
+        'over_capacity': max(lane_totals) > order.capacity_m,
+    }
+
+@app.route('/upload_preview/<int:order_id>', methods=['POST'])
+def upload_preview(order_id):
+    """Náhled importu: počty palet, LSA, metrů a výsledné lanes (bez zápisu)"""
+    order = Order.query.get_or_404(order_id)
+    file = request.files.get('file')
+    if not file:
+        return jsonify({'success': False, 'error': 'Please upload a file'}), 400
+    profile = request.form.get('profile') or None
+    prune_import_previews()
+    
+    try:
+        spooled_path, file_hash, _ = spool_upload(file.stream, IMPORT_JOBS_DIR)
+    except UploadTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    
+    duplicate = import_duplicate_message(file_hash)
+    if duplicate:
+        os.remove(spooled_path)
+        return jsonify({'success': False, 'error': duplicate})
+    
+    # Náhled patří zakázce, pro kterou byl udělán naposledy - jen do ní jde potvrdit
+    meta = save_import_preview(file_hash, spooled_path, file.filename, profile, order.id)
+    try:
+        batch = import_preview_batch(file_hash, meta)
+    except Exception as e:
+        discard_import_preview(file_hash, meta)
+        return jsonify({'success': False, 'error': f'Failed to read Excel file: {e}'}), 400
+    if len(batch) == 0:
+        discard_import_preview(file_hash, meta)
+        return jsonify({'success': False, 'error': 'Excel does not contain any valid pallet rows'}), 400
+    
+    return jsonify({
+        'success': True,
+        'file_hash': file_hash,
+        'filename': meta['filename'],
+        'preview': build_import_preview(order, batch)
+    })
+
+@app.route('/upload_commit/<int:order_id>', methods=['POST'])
+def upload_commit(order_id):
+    """Potvrzení importu z náhledu - vloží dávku náhledu (z paměti, jinak ze souboru na disku)"""
+    order = Order.query.get_or_404(order_id)
+    data = request.get_json(silent=True) or request.form
+    file_hash = data.get('file_hash')
+    
+    meta = load_import_preview(file_hash)
+    if meta is None:
+        return jsonify({'success': False, 'error': 'Náhled importu vypršel, nahrajte soubor znovu'}), 410
+    if meta['order_id'] != order.id:
+        return jsonify({'success': False, 'error': 'Náhled importu patří jiné zakázce, nahrajte soubor znovu'}), 409
+    
+    # Mezitím mohl stejný soubor doběhnout nebo se zařadit do fronty jinou cestou
+    duplicate = import_duplicate_message(file_hash)
+    if duplicate:
+        discard_import_preview(file_hash, meta)
+        return jsonify({'success': False, 'error': duplicate})
+    
+    try:
+        batch = import_preview_batch(file_hash, meta)
+    except Exception as e:
+        discard_import_preview(file_hash, meta)
+        return jsonify({'success': False, 'error': f'Failed to read Excel file: {e}'}), 400
+    
+    try:
+        imported_file = ImportedFile(filename=meta['filename'], file_hash=file_hash, order_id=order.id)
+        db.session.add(imported_file)
+        db.session.flush()
+        rows_imported = bulk_insert_pallets(order.id, batch, imported_file.id)
+        imported_file.rows_imported = rows_imported
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Chyba při ukládání: {str(e)}'})
+    discard_import_preview(file_hash, meta)
+    
+    auto_assign_lanes(order.id)
+    
+    flash(f'Imported {rows_imported} pallets from "{meta["filename"]}" and auto-assigned to lanes.', 'success')
+    return jsonify({
+        'success': True,
+        'message': f'Importováno {rows_imported} palet',
+        'rows_imported': rows_imported,
+        'redirect_url': url_for('order_view', order_id=order.id)
+    })
 
 @app.route('/assign', methods=['POST'])
 def assign():
@@ -753,102 +3323,63 @@ def assign():
 
 @app.route('/auto_assign/<int:order_id>', methods=['POST'])
 def auto_assign_route(order_id):
-    auto_assign_lanes(order_id)
-    flash('Palety byly automaticky přiřazeny do lanes.', 'success')
+    plan = auto_assign_lanes(order_id)
+    if plan is not None and not plan.quality['fits']:
+        flash(f'Palety byly přiřazeny do lanes, ale zakázka se nevejde (přesah {plan.quality["overflow_m"]} m).', 'warning')
+    else:
+        flash('Palety byly automaticky přiřazeny do lanes.', 'success')
     return redirect(url_for('order_view', order_id=order_id))
 
-def optimize_lane_assignment(order_id):
-    """Optimalizuje přiřazení LSA do lanes podle reálného postupu nakládky"""
+def optimize_lane_assignment(order_id, strategy='loading_order', time_budget_s=None):
+    """Přeorganizuje lanes zakázky zvolenou strategií z LANE_STRATEGIES.
+
+    Výchozí 'loading_order' odpovídá reálnému postupu nakládky (LSA
+    postupně), 'exact' je přesný solver s časovým limitem. Vrací LanePlan.
+    """
     order = Order.query.get_or_404(order_id)
-    items = PalletItem.query.filter_by(order_id=order.id).all()
-    
-    if not items:
-        return [0.0, 0.0, 0.0]
-    
-    # Seskupíme palety podle LSA (postupné nakládání po LSA)
-    lsa_groups = {}
-    for item in items:
-        if item.lsa not in lsa_groups:
-            lsa_groups[item.lsa] = []
-        lsa_groups[item.lsa].append(item)
-    
-    # Inicializujeme lanes
-    lane_totals = [0.0, 0.0, 0.0]
-    max_lane_capacity = 13.6
-    
-    # Procházíme LSA postupně (jak přijdou na nakládku)
-    for lsa, lsa_items in lsa_groups.items():
-        # Spočítáme celkovou délku tohoto LSA
-        lsa_total_length = sum(item.length_m for item in lsa_items)
-        
-        # Pokud se celé LSA vejde do jedné lane, najdeme nejlepší místo
-        best_single_lane = None
-        for i in range(3):
-            if lane_totals[i] + lsa_total_length <= max_lane_capacity:
-                if best_single_lane is None or lane_totals[i] < lane_totals[best_single_lane]:
-                    best_single_lane = i
-        
-        if best_single_lane is not None:
-            # Celé LSA umístíme do jedné lane
-            for item in lsa_items:
-                item.assigned_lane = best_single_lane + 1
-            lane_totals[best_single_lane] += lsa_total_length
-        else:
-            # LSA se nevejde do žádné lane celé, musíme ho rozdělit
-            # Postupně přiřazujeme palety z LSA do lanes (1,2,3,1,2,3...)
-            current_lane = 0
-            
-            for item in lsa_items:
-                # Najdeme první lane, kam se paleta vejde
-                assigned = False
-                for attempt in range(3):  # Zkusíme všechny 3 lanes
-                    lane_idx = (current_lane + attempt) % 3
-                    if lane_totals[lane_idx] + item.length_m <= max_lane_capacity:
-                        item.assigned_lane = lane_idx + 1
-                        lane_totals[lane_idx] += item.length_m
-                        current_lane = (lane_idx + 1) % 3  # Další paleta začne od následující lane
-                        assigned = True
-                        break
-                
-                # Pokud se paleta nevejde nikam, přiřadíme ji do nejméně zatížené lane
-                if not assigned:
-                    best_lane = lane_totals.index(min(lane_totals))
-                    item.assigned_lane = best_lane + 1
-                    lane_totals[best_lane] += item.length_m
-                    current_lane = (best_lane + 1) % 3
-    
-    # Finalizační fáze: přesuň palety z přetížených lanes do těch s volným místem
-    max_lane_capacity = 13.6
-    items_to_move = []
-    
-    # Najdi přetížené lanes a palety k přesunu
-    for lane_idx in range(3):
-        if lane_totals[lane_idx] > max_lane_capacity:
-            # Najdi palety v této lane (seřazené od nejmenších)
-            lane_items = [item for item in items if item.assigned_lane == lane_idx + 1]
-            lane_items.sort(key=lambda x: x.length_m)
-            
-            # Zkus přesunout nejmenší palety
-            for item in lane_items:
-                if lane_totals[lane_idx] <= max_lane_capacity:
-                    break
-                    
-                # Najdi jinou lane s dostatečným místem
-                for target_lane in range(3):
-                    if target_lane != lane_idx and lane_totals[target_lane] + item.length_m <= max_lane_capacity:
-                        # Přesuň paletu
-                        lane_totals[lane_idx] -= item.length_m
-                        lane_totals[target_lane] += item.length_m
-                        item.assigned_lane = target_lane + 1
-                        break
+    arrays = LaneArrays.load(order.id)
+    capacity_cm = int(round((order.capacity_m or DEFAULT_LANE_CAPACITY) * 100))
     
-    db.session.commit()
-    return lane_totals
+    plan = cached_lane_strategy(strategy, arrays, capacity_cm, time_budget_s)
+    mark_order_aggregates([order.id])
+    if write_lane_vector(arrays, plan.lanes) or db.session.dirty:
+        db.session.commit()
+    return plan
 
 @app.route('/optimize_lanes/<int:order_id>', methods=['POST'])
 def optimize_lanes_route(order_id):
-    lane_totals = optimize_lane_assignment(order_id)
-    flash(f'Lanes přeorganizovány podle reálného postupu nakládky: Lane 1: {lane_totals[0]:.2f}m, Lane 2: {lane_totals[1]:.2f}m, Lane 3: {lane_totals[2]:.2f}m', 'success')
+    order = Order.query.get_or_404(order_id)
+    data = request.get_json(silent=True) or request.form
+    # 'mode' je původní název parametru (mode=exact)
+    strategy = data.get('strategy') or data.get('mode') or 'loading_order'
+    if strategy not in LANE_STRATEGIES:
+        if wants_json_response():
+            return jsonify({'success': False, 'error': f'Neznámá strategie "{strategy}"'}), 400
+        flash(f'Neznámá strategie "{strategy}"', 'warning')
+        return redirect(url_for('order_view', order_id=order_id))
+    try:
+        time_budget_s = float(data['time_budget']) if data.get('time_budget') else None
+    except (TypeError, ValueError):
+        time_budget_s = None
+    if time_budget_s is not None:
+        time_budget_s = min(max(time_budget_s, 0.1), 60.0)
+    
+    # Zapamatovat strategii pro další automatická přiřazení (import, auto-assign)
+    if data.get('remember'):
+        order.lane_strategy = strategy
+    plan = optimize_lane_assignment(order_id, strategy, time_budget_s)
+    if wants_json_response():
+        return jsonify({'success': True, 'plan': plan.to_dict()})
+    
+    lane_totals = plan.lane_totals
+    totals_text = f'Lane 1: {lane_totals[0]:.2f}m, Lane 2: {lane_totals[1]:.2f}m, Lane 3: {lane_totals[2]:.2f}m'
+    if strategy == 'exact':
+        result_text = 'optimální řešení' if plan.optimal else f'nejlepší nalezené řešení (limit {plan.elapsed_s:.1f} s vypršel)'
+        flash(f'Lanes přeorganizovány přesným solverem - {result_text} za {plan.elapsed_s:.2f} s: {totals_text}', 'success' if plan.quality['fits'] else 'warning')
+    elif strategy == 'loading_order':
+        flash(f'Lanes přeorganizovány podle reálného postupu nakládky: {totals_text}', 'success')
+    else:
+        flash(f'Lanes přeorganizovány strategií "{LANE_STRATEGIES[strategy]["label"]}": {totals_text}', 'success' if plan.quality['fits'] else 'warning')
     return redirect(url_for('order_view', order_id=order_id))
 
 @app.route('/edit_order_name/<int:order_id>', methods=['POST'])
@@ -912,6 +3443,179 @@ def remove_lsa():
     flash(f'Přesunuto {count} palet s LSA {lsa} do zakázky "Vyřazené z nakládky" (uloženo na později)', 'info')
     return redirect(url_for('order_view', order_id=order_id))
 
+@app.route('/drop_revision_removed/<int:order_id>', methods=['POST'])
+def drop_revision_removed(order_id):
+    """Smaže palety, které dodavatel v revidovaném souboru odebral"""
+    order = Order.query.get_or_404(order_id)
+    count = PalletItem.query.filter_by(order_id=order.id, revision_removed=True).delete()
+    mark_order_aggregates([order.id])
+    db.session.commit()
+    flash(f'Smazáno {count} palet odebraných v revizi souboru', 'info')
+    return redirect(url_for('order_view', order_id=order_id))
+
+# Plánování kamionů - rozdělení zásoby palet z více zakázek do navržených zakázek
+TRUCK_PLAN_CACHE = TTLCache(max_entries=10, ttl_seconds=30 * 60)
+
+def truck_types():
+    """Typy kamionů z nastavení - název -> délka lane v metrech"""
+    return {
+        'standard': SETTINGS.get('default_capacity_m', 13.6),
+        'alternative': SETTINGS.get('alternative_capacity_m', 15.4),
+    }
+
+def build_truck_plan(order_ids, truck_type='auto'):
+    """Naplánuje kamiony pro palety zadaných zakázek.
+
+    truck_type='auto' zkusí oba typy kamionů z nastavení a vybere ten s
+    menším počtem kamionů, při shodě s nižší cenou.
+    """
+    arrays = LaneArrays.load_pool(order_ids)
+    price_per_place = SETTINGS.get('price_per_place', 1160.0)
+    full_truck_price = SETTINGS.get('full_truck_price', 25600.0)
+    types = truck_types()
+    candidates = types if truck_type == 'auto' else {truck_type: types[truck_type]}
+    
+    best = None
+    for name, capacity_m in candidates.items():
+        capacity_cm = int(round(capacity_m * 100))
+        trucks = []
+        lsa_trucks = {}
+        for number, (indexes, plan) in enumerate(plan_trucks(arrays, capacity_cm), start=1):
+            pallet_places, price, is_full = compute_pallet_price(plan.lane_totals, price_per_place, full_truck_price)
+            groups = pd.unique(arrays.group_index[indexes]).tolist()
+            for group in groups:
+                lsa_trucks.setdefault(group, set()).add(number)
+            trucks.append({
+                'number': number,
+                'pallet_ids': arrays.ids[indexes].tolist(),
+                'lanes': plan.lanes.tolist(),
+                'pallets': len(indexes),
+                'lsa': [arrays.group_labels[group] for group in groups],
+                'lane_totals': [round(total, 2) for total in plan.lane_totals],
+                'quality': plan.quality,
+                'pallet_places': pallet_places,
+                'price': price,
+                'is_full': is_full,
+            })
+        result = {
+            'truck_type': name,
+            'capacity_m': capacity_m,
+            'order_ids': list(order_ids),
+            'pool_fingerprint': arrays.fingerprint(),
+            'pallets': len(arrays),
+            'total_length_m': round(float(arrays.length_cm.sum()) / 100.0, 2),
+            'min_trucks': int(-(-int(arrays.length_cm.sum()) // (capacity_cm * LANE_COUNT))),
+            'trucks': trucks,
+            'total_price': round(sum(truck['price'] for truck in trucks), 2),
+            'split_lsa_groups': sum(1 for numbers in lsa_trucks.values() if len(numbers) > 1),
+        }
+        if best is None or (len(trucks), result['total_price']) < (len(best['trucks']), best['total_price']):
+            best = result
+    return best
+
+def _truck_plan_public(plan):
+    # Bez seznamů id palet a otisku zásoby - ty zůstávají jen v cache pro potvrzení
+    public = {key: value for key, value in plan.items() if key != 'pool_fingerprint'}
+    return dict(public, trucks=[
+        {key: value for key, value in truck.items() if key not in ('pallet_ids', 'lanes')}
+        for truck in plan['trucks']
+    ])
+
+@app.route('/truck_plan', methods=['GET', 'POST'])
+def truck_plan():
+    """Návrh rozdělení zásoby palet (více zakázek) do co nejmenšího počtu kamionů"""
+    open_orders = Order.query.filter_by(closed=False).order_by(Order.created_at).all()
+    if request.method == 'GET':
+        return render_template('truck_plan.html', open_orders=open_orders, truck_types=truck_types(), plan=None,
+                               selected_ids={order.id for order in open_orders if order.saved_for_later})
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        order_ids = [int(order_id) for order_id in (data.get('order_ids') or request.form.getlist('order_id'))]
+    except (TypeError, ValueError):
+        order_ids = []
+    truck_type = data.get('truck_type') or request.form.get('truck_type') or 'auto'
+    open_ids = {order.id for order in open_orders}
+    
+    error = None
+    if not order_ids:
+        error = 'Vyberte alespoň jednu zakázku'
+    elif not set(order_ids) <= open_ids:
+        error = 'Plánovat lze jen otevřené zakázky'
+    elif truck_type != 'auto' and truck_type not in truck_types():
+        error = f'Neznámý typ kamionu "{truck_type}"'
+    if error:
+        if wants_json_response():
+            return jsonify({'success': False, 'error': error}), 400
+        flash(error, 'warning')
+        return redirect(url_for('truck_plan'))
+    
+    plan = build_truck_plan(order_ids, truck_type)
+    token = secrets.token_urlsafe(12)
+    TRUCK_PLAN_CACHE.put(token, plan)
+    if wants_json_response():
+        return jsonify({'success': True, 'token': token, 'plan': _truck_plan_public(plan)})
+    return render_template('truck_plan.html', open_orders=open_orders, truck_types=truck_types(),
+                           plan=plan, token=token, selected_ids=set(order_ids), truck_type=truck_type)
+
+@app.route('/truck_plan/accept', methods=['POST'])
+def accept_truck_plan():
+    """Potvrzení plánu jedním klikem - založí zakázky a přesune do nich palety"""
+    data = request.get_json(silent=True) or request.form
+    token = data.get('token')
+    plan = TRUCK_PLAN_CACHE.pop(token) if token else None
+    
+    def fail(message, status):
+        if wants_json_response():
+            return jsonify({'success': False, 'error': message}), status
+        flash(message, 'warning')
+        return redirect(url_for('truck_plan'))
+    
+    if plan is None:
+        return fail('Plán vypršel, spočítejte ho znovu', 410)
+    
+    # Zásoba se od výpočtu nesmí změnit (přesuny, importy, úpravy palet, uzavření zakázek) -
+    # porovnává se přesná množina id palet i otisk jejich LSA, délek a pořadí
+    table = PalletItem.__table__
+    pallet_ids = [pallet_id for truck in plan['trucks'] for pallet_id in truck['pallet_ids']]
+    current = LaneArrays.load_pool(plan['order_ids'])
+    open_count = Order.query.filter(Order.id.in_(plan['order_ids']), Order.closed == False).count()
+    if (set(current.ids.tolist()) != set(pallet_ids) or current.fingerprint() != plan['pool_fingerprint']
+            or open_count != len(set(plan['order_ids']))):
+        return fail('Zásoba palet se od výpočtu plánu změnila, spočítejte ho znovu', 409)
+    
+    prefix = (data.get('name_prefix') or '').strip() or f'Plán {datetime.now().strftime("%d.%m.%Y")}'
+    updates = []
+    created = []
+    for truck in plan['trucks']:
+        order = Order(
+            name=f'{prefix} - kamion {truck["number"]}/{len(plan["trucks"])}',
+            capacity_m=plan['capacity_m'],
+            price_per_place=SETTINGS.get('price_per_place', 1160.0),
+            full_truck_price=SETTINGS.get('full_truck_price', 25600.0)
+        )
+        db.session.add(order)
+        db.session.flush()
+        created.append(order)
+        for position, (pallet_id, lane) in enumerate(zip(truck['pallet_ids'], truck['lanes']), start=1):
+            updates.append({'b_id': pallet_id, 'b_order_id': order.id, 'b_lane': lane, 'b_import_order': position})
+    
+    update_stmt = table.update().where(table.c.id == db.bindparam('b_id')).values(
+        order_id=db.bindparam('b_order_id'),
+        assigned_lane=db.bindparam('b_lane'),
+        import_order=db.bindparam('b_import_order')
+    )
+    for i in range(0, len(updates), BULK_INSERT_CHUNK):
+        db.session.execute(update_stmt, updates[i:i + BULK_INSERT_CHUNK])
+    mark_order_aggregates(list(plan['order_ids']) + [order.id for order in created])
+    db.session.commit()
+    
+    message = f'Vytvořeno {len(created)} zakázek z plánu kamionů ({len(pallet_ids)} palet)'
+    if wants_json_response():
+        return jsonify({'success': True, 'message': message, 'order_ids': [order.id for order in created]})
+    flash(message, 'success')
+    return redirect(url_for('loading_orders'))
+
 @app.route('/create_test_order', methods=['POST'])
 def create_test_order():
     """Vytvoří testovací prázdnou zakázku pro testování delete funkcionality"""
@@ -978,10 +3682,12 @@ def delete_order(order_id):
         
         # Smazání importovaných souborů souvisejících se zakázkou
         ImportedFile.query.filter_by(order_id=order.id).delete()
+        ImportJob.query.filter_by(order_id=order.id).delete()
         
         # Smazání zakázky
         db.session.delete(order)
         db.session.commit()
+        ORDER_RENDER_CACHE.clear()
         
         return jsonify({
             'success': True, 
@@ -1015,24 +3721,12 @@ def close_order():
             flash('Neplatný formát data/času nakládky', 'danger')
             return redirect(url_for('order_view', order_id=order.id))
     
-    # compute lane totals
-    lane_totals = {1:0.0,2:0.0,3:0.0}
-    for it in order.items:
-        if it.assigned_lane in (1,2,3):
-            lane_totals[it.assigned_lane] += it.length_m
-    sum_cols = lane_totals[1] + lane_totals[2] + lane_totals[3]
-    
     # Check capacity constraint
-    max_lane = max(lane_totals.values())
-    if max_lane > order.capacity_m:
-        flash(f'Cannot close order: lane length {max_lane:.2f}m exceeds vehicle capacity {order.capacity_m}m. Remove LSA groups until below capacity.', 'danger')
+    snapshot = get_order_snapshot(order)
+    if snapshot.over_capacity:
+        flash(f'Cannot close order: lane length {snapshot.max_lane:.2f}m exceeds vehicle capacity {order.capacity_m}m. Remove LSA groups until below capacity.', 'danger')
         return redirect(url_for('order_view', order_id=order.id))
-    
-    # compute pallet places and price and mark closed
-    pallet_places = round((sum_cols / 3.0) / 0.4, 2) if sum_cols > 0 else 0.0
-    price = round(pallet_places * order.price_per_place, 2)
-    if price >= order.full_truck_price:
-        price = order.full_truck_price
+    pallet_places, price = snapshot.pallet_places, snapshot.price
     
     # Update order with carrier info
     order.closed = True
@@ -1062,6 +3756,10 @@ def close_order():
 @app.route('/export_order/<int:order_id>')
 def export_order(order_id):
     order = Order.query.get_or_404(order_id)
+    etag = order_etag(order, 'export_order')
+    not_modified = order_not_modified(etag)
+    if not_modified:
+        return not_modified
     # produce CSV summary
     output = BytesIO()
     rows = ["lsa,pallet_text,length_m,assigned_lane,weight"]
@@ -1069,39 +3767,39 @@ def export_order(order_id):
         rows.append(f'{it.lsa},{it.pallet_text},{it.length_m},{it.assigned_lane},{it.weight}')
     output.write('\n'.join(rows).encode('utf-8'))
     output.seek(0)
-    return send_file(output, as_attachment=True, download_name=f'order_{order.id}.csv', mimetype='text/csv')
+    return order_conditional(send_file(output, as_attachment=True, download_name=f'order_{order.id}.csv', mimetype='text/csv'), etag)
 
 @app.route('/print_order/<int:order_id>')
 def print_order(order_id):
     order = Order.query.get_or_404(order_id)
-    # lane totals
-    lane_totals = {1:0.0,2:0.0,3:0.0}
-    for it in order.items:
-        if it.assigned_lane in (1,2,3):
-            lane_totals[it.assigned_lane] += it.length_m
-    # compute pallet places
-    sum_cols = lane_totals[1] + lane_totals[2] + lane_totals[3]
-    pallet_places = 0.0
-    if sum_cols > 0:
-        pallet_places = round((sum_cols / 3.0) / 0.4, 2)
-    price = round(pallet_places * order.price_per_place, 2)
-    is_full = price >= order.full_truck_price
-    if is_full:
-        price = order.full_truck_price
-    return render_template('print_order.html', order=order, lane_totals=lane_totals, pallet_places=pallet_places, price=price, is_full=is_full)
+    etag = order_etag(order, 'print_order')
+    not_modified = order_not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    def render():
+        snapshot = get_order_snapshot(order)
+        return render_template(
+            'print_order.html', order=order, pallets=snapshot.pallets, lane_totals=snapshot.lane_totals,
+            pallet_places=snapshot.pallet_places, price=snapshot.price, is_full=snapshot.is_full
+        )
+    return order_conditional(cached_order_render(order, etag, render), etag)
 
 @app.route('/settings')
 def settings():
-    return render_template('settings.html', settings=SETTINGS)
+    return render_template('settings.html', settings=SETTINGS, lane_strategies=LANE_STRATEGIES, default_lane_strategy=resolve_lane_strategy())
 
 @app.route('/update_settings', methods=['POST'])
 def update_settings():
     global SETTINGS
     try:
+        previous_capacity_m = SETTINGS.get('default_capacity_m', 13.6)
         SETTINGS['price_per_place'] = float(request.form.get('price_per_place', 1160.0))
         SETTINGS['full_truck_price'] = float(request.form.get('full_truck_price', 25600.0))
         SETTINGS['default_capacity_m'] = float(request.form.get('default_capacity_m', 13.6))
         SETTINGS['alternative_capacity_m'] = float(request.form.get('alternative_capacity_m', 15.4))
+        if request.form.get('lane_strategy') in LANE_STRATEGIES:
+            SETTINGS['lane_strategy'] = request.form.get('lane_strategy')
         
         # Update email recipients
         recipients_text = request.form.get('email_recipients', '')
@@ -1120,11 +3818,107 @@ def update_settings():
             json.dump(SETTINGS, f, indent=2, ensure_ascii=False)
             
         flash('Nastavení bylo uloženo', 'success')
+        
+        # Nová výchozí kapacita se propíše do otevřených zakázek a lanes se přepočítají na pozadí
+        if 'reoptimize_open_orders' in request.form:
+            capacity_changed = SETTINGS['default_capacity_m'] != previous_capacity_m
+            job = enqueue_reoptimize_job(
+                'settings',
+                capacity_m=SETTINGS['default_capacity_m'] if capacity_changed else None,
+                previous_capacity_m=previous_capacity_m if capacity_changed else None
+            )
+            return redirect(url_for('reoptimize_job_view', job_id=job.id))
     except Exception as e:
         flash(f'Chyba při ukládání nastavení: {str(e)}', 'danger')
     
     return redirect(url_for('settings'))
 
+# Součty lanes po zakázkách v celých cm (index 0 = nepřiřazené) - přesun jedné
+# palety je jen odečtení a přičtení její délky, jiné zápisy palet položku zahodí.
+# Položka nese Order.version, ze které vznikla - zápisy z jiných workerů verzi
+# zvednou a položka se při čtení zahodí.
+LANE_TOTALS_CACHE = TTLCache(max_entries=256, ttl_seconds=10 * 60)
+
+@db.event.listens_for(db.session, 'before_flush')
+def _invalidate_lane_totals_on_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, PalletItem):
+            LANE_TOTALS_CACHE.pop(obj.order_id)
+            # Paleta přesunutá do jiné zakázky - zahodit i původní
+            for order_id in db.inspect(obj).attrs.order_id.history.deleted or ():
+                LANE_TOTALS_CACHE.pop(order_id)
+
+@db.event.listens_for(db.session, 'do_orm_execute')
+def _invalidate_lane_totals_on_bulk(orm_execute_state):
+    # Hromadné UPDATE/INSERT/DELETE nad paletami - zakázky nepoznáme, zahodíme vše
+    if orm_execute_state.is_update or orm_execute_state.is_insert or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and table.name == PalletItem.__tablename__:
+            LANE_TOTALS_CACHE.clear()
+
+def _order_version(order_id):
+    return db.session.execute(db.select(Order.version).where(Order.id == order_id)).scalar()
+
+def lane_totals_cm(order_id):
+    """Součty lanes zakázky v cm [nepřiřazené, lane 1, ...] a verze zakázky, ke které patří.
+
+    Z cache, pokud sedí verze zakázky v DB, jinak jedním agregačním dotazem.
+    """
+    version = _order_version(order_id)
+    cached = LANE_TOTALS_CACHE.get(order_id)
+    if cached is not None and cached[0] == version:
+        totals = cached[1]
+    else:
+        table = PalletItem.__table__
+        rows = db.session.execute(
+            db.select(table.c.assigned_lane, db.func.sum(db.func.round(table.c.length_m * 100)))
+            .where(table.c.order_id == order_id)
+            .group_by(table.c.assigned_lane)
+        ).all()
+        totals = [0] * (LANE_COUNT + 1)
+        for lane, total_cm in rows:
+            lane = lane or 0
+            if 0 <= lane <= LANE_COUNT:
+                totals[lane] += int(total_cm or 0)
+        LANE_TOTALS_CACHE.put(order_id, (version, totals))
+    return list(totals), version
+
+def move_lane_totals(order_id, totals, version, length_m, old_lane, new_lane):
+    """Přesun palety v součtech: stará lane minus délka, nová plus délka.
+
+    Volá se po commitu přesunu. Do cache se uloží jen tehdy, když commit zvedl
+    verzi zakázky právě o jednu - jinak mezitím zapisoval i někdo jiný.
+    """
+    length_cm = int(round((length_m or 0.0) * 100))
+    totals = list(totals)
+    if 0 <= (old_lane or 0) <= LANE_COUNT:
+        totals[old_lane or 0] -= length_cm
+    if 0 <= (new_lane or 0) <= LANE_COUNT:
+        totals[new_lane or 0] += length_cm
+    current_version = _order_version(order_id)
+    if version is not None and current_version == version + 1:
+        LANE_TOTALS_CACHE.put(order_id, (current_version, totals))
+    else:
+        LANE_TOTALS_CACHE.pop(order_id)
+        totals, _ = lane_totals_cm(order_id)
+    return totals
+
+def lane_totals_payload(order, totals):
+    """Součty lanes, paletová místa, cena a příznaky kapacity pro JSON odpověď"""
+    lane_totals = [total / 100.0 for total in totals[1:]]
+    pallet_places, price, is_full = compute_pallet_price(lane_totals, order.price_per_place, order.full_truck_price)
+    capacity_m = order.capacity_m or DEFAULT_LANE_CAPACITY
+    return {
+        'lane_totals': {lane: round(total, 2) for lane, total in enumerate(lane_totals, start=1)},
+        'unassigned_m': round(totals[0] / 100.0, 2),
+        'total_m': round(sum(lane_totals), 2),
+        'pallet_places': pallet_places,
+        'price': price,
+        'is_full': is_full,
+        'capacity_m': capacity_m,
+        'over_capacity': {lane: total > capacity_m + 1e-9 for lane, total in enumerate(lane_totals, start=1)},
+    }
+
 @app.route('/move_pallet_position', methods=['POST'])
 def move_pallet_position():
     """API endpoint pro přesun palety s přesnou pozicí"""
@@ -1136,6 +3930,9 @@ def move_pallet_position():
         
         if not item_id or new_lane is None:
             return jsonify({'success': False, 'error': 'Chybí parametry'})
+        new_lane = int(new_lane)
+        if not 0 <= new_lane <= LANE_COUNT:
+            return jsonify({'success': False, 'error': 'Neplatná lane'})
         
         # Najdeme paletu
         item = db.session.get(PalletItem, item_id)
@@ -1144,6 +3941,7 @@ def move_pallet_position():
         
         old_lane = item.assigned_lane
         order_id = item.order_id
+        totals, version = lane_totals_cm(order_id)
         
         # Získáme všechny palety v cílovém lane seřazené podle import_order
         target_items = PalletItem.query.filter(
@@ -1195,12 +3993,14 @@ def move_pallet_position():
         
         try:
             db.session.commit()
+            totals = move_lane_totals(order_id, totals, version, item.length_m, old_lane, new_lane)
             return jsonify({
                 'success': True, 
                 'message': f'Paleta přesunuta z Lane {old_lane} do Lane {new_lane} na pozici {position}',
                 'old_lane': old_lane,
                 'new_lane': new_lane,
-                'position': position
+                'position': position,
+                **lane_totals_payload(db.session.get(Order, order_id), totals)
             })
         except Exception as e:
             db.session.rollback()
@@ -1219,6 +4019,9 @@ def move_pallet():
         
         if not item_id or new_lane is None:
             return jsonify({'success': False, 'error': 'Chybí parametry'})
+        new_lane = int(new_lane)
+        if not 0 <= new_lane <= LANE_COUNT:
+            return jsonify({'success': False, 'error': 'Neplatná lane'})
         
         # Najdeme paletu
         item = PalletItem.query.get(item_id)
@@ -1227,15 +4030,19 @@ def move_pallet():
         
         # Aktualizujeme lane
         old_lane = item.assigned_lane
+        order_id = item.order_id
+        totals, version = lane_totals_cm(order_id)
         item.assigned_lane = new_lane
         
         try:
             db.session.commit()
+            totals = move_lane_totals(order_id, totals, version, item.length_m, old_lane, new_lane)
             return jsonify({
                 'success': True, 
                 'message': f'Paleta přesunuta z Lane {old_lane} do Lane {new_lane}',
                 'old_lane': old_lane,
-                'new_lane': new_lane
+                'new_lane': new_lane,
+                **lane_totals_payload(db.session.get(Order, order_id), totals)
             })
         except Exception as e:
             db.session.rollback()
@@ -1460,26 +4267,33 @@ def import_lsa_to_order():
         if not target_order_id or not selected_items:
             return jsonify({'success': False, 'error': 'Chybí parametry'})
         
+        target_order_id = int(target_order_id)
+        selected_items = [int(item_id) for item_id in selected_items]
         target_order = Order.query.get_or_404(target_order_id)
         
-        # Najdeme nejvyšší import_order v cílové zakázce
-        max_import_order = db.session.query(db.func.max(PalletItem.import_order)).filter_by(order_id=target_order_id).scalar() or 0
-        
-        imported_count = 0
-        imported_lsa = set()
-        
-        for item_id in selected_items:
-            item = PalletItem.query.get(item_id)
-            if item and item.order_id != target_order_id:
-                # Přesuneme item do cílové zakázky
-                old_order_id = item.order_id
-                item.order_id = target_order_id
-                item.assigned_lane = 0  # Reset lane assignment
-                max_import_order += 1
-                item.import_order = max_import_order
-                
-                imported_count += 1
-                imported_lsa.add(item.lsa)
+        # Vybrané palety z jiných zakázek (jedním dotazem, v pořadí výběru)
+        rows = db.session.query(PalletItem.id, PalletItem.lsa, PalletItem.order_id).filter(
+            PalletItem.id.in_(selected_items),
+            PalletItem.order_id != target_order_id
+        ).all()
+        lsa_by_id = {item_id: lsa for item_id, lsa, _ in rows}
+        mark_order_aggregates({source_order_id for _, _, source_order_id in rows} | {target_order_id})
+        item_ids = [item_id for item_id in dict.fromkeys(selected_items) if item_id in lsa_by_id]
+        
+        # Přesuneme palety do cílové zakázky - import_order navazuje na poslední paletu
+        start = next_import_order(target_order_id)
+        table = PalletItem.__table__
+        update_stmt = table.update().where(table.c.id == db.bindparam('b_id')).values(
+            order_id=target_order_id,
+            assigned_lane=0,  # Reset lane assignment
+            import_order=db.bindparam('b_import_order')
+        )
+        params = [{'b_id': item_id, 'b_import_order': start + pos} for pos, item_id in enumerate(item_ids)]
+        for i in range(0, len(params), BULK_INSERT_CHUNK):
+            db.session.execute(update_stmt, params[i:i + BULK_INSERT_CHUNK])
+        
+        imported_count = len(item_ids)
+        imported_lsa = set(lsa_by_id[item_id] for item_id in item_ids)
         
         db.session.commit()
         
@@ -1493,6 +4307,104 @@ def import_lsa_to_order():
     except Exception as e:
         return jsonify({'success': False, 'error': f'Chyba při importu LSA: {str(e)}'})
 
+# Simulace běží při každé změně výběru - přesný solver (výchozí strategie zakázky) má zkrácený limit
+SIMULATION_EXACT_BUDGET_S = 0.2
+
+def simulate_lane_assignment(order_id, add_item_ids=(), remove_item_ids=(), remove_lsa=(), strategy=None):
+    """Co kdyby: lanes zakázky po přidání/odebrání palet, jen v paměti.
+
+    Čte jen sloupce přes samostatné spojení - session, identity map ani
+    data v DB se nemění. Přidané palety jdou za stávající v pořadí výběru
+    (stejně jako import_lsa_to_order). Vrací None, pokud zakázka neexistuje.
+    """
+    orders = Order.__table__
+    table = PalletItem.__table__
+    columns = (table.c.id, table.c.lsa, table.c.length_m, table.c.weight, table.c.assigned_lane)
+    add_item_ids = list(dict.fromkeys(add_item_ids))
+    with db.engine.connect() as conn:
+        order = conn.execute(
+            db.select(orders.c.capacity_m, orders.c.price_per_place, orders.c.full_truck_price, orders.c.lane_strategy)
+            .where(orders.c.id == order_id)
+        ).first()
+        if order is None:
+            return None
+        existing = conn.execute(
+            db.select(*columns).where(table.c.order_id == order_id).order_by(table.c.import_order, table.c.id)
+        ).all()
+        added = conn.execute(
+            db.select(*columns).where(table.c.id.in_(add_item_ids), table.c.order_id != order_id)
+        ).all() if add_item_ids else []
+    
+    removed_ids = set(remove_item_ids)
+    removed_lsa = set(remove_lsa)
+    kept = [row for row in existing if row.id not in removed_ids and row.lsa not in removed_lsa]
+    position = {item_id: pos for pos, item_id in enumerate(add_item_ids)}
+    added = sorted(added, key=lambda row: position[row.id])
+    rows = kept + added
+    
+    capacity_m = order.capacity_m or DEFAULT_LANE_CAPACITY
+    strategy = strategy if strategy in LANE_STRATEGIES else resolve_lane_strategy(order)
+    arrays = LaneArrays.from_columns(
+        [row.id for row in rows], [row.lsa for row in rows],
+        [row.length_m or 0.0 for row in rows], np.arange(len(rows))
+    )
+    time_budget_s = SIMULATION_EXACT_BUDGET_S if LANE_STRATEGIES[strategy]['time_budget'] else None
+    plan = cached_lane_strategy(strategy, arrays, int(round(capacity_m * 100)), time_budget_s)
+    pallet_places, price, is_full = compute_pallet_price(plan.lane_totals, order.price_per_place, order.full_truck_price)
+    
+    # Současný stav (podle přiřazených lanes) pro porovnání
+    current_totals = [0.0] * LANE_COUNT
+    for row in existing:
+        if 1 <= (row.assigned_lane or 0) <= LANE_COUNT:
+            current_totals[row.assigned_lane - 1] += row.length_m or 0.0
+    current_places, current_price, _ = compute_pallet_price(current_totals, order.price_per_place, order.full_truck_price)
+    
+    return {
+        'strategy': strategy,
+        'pallets': len(rows),
+        'added_pallets': len(added),
+        'removed_pallets': len(existing) - len(kept),
+        'lsa_groups': len(set(row.lsa for row in rows)),
+        'total_weight': round(sum(row.weight or 0.0 for row in rows), 1),
+        'lane_totals': {lane: round(total, 2) for lane, total in zip((1, 2, 3), plan.lane_totals)},
+        'over_capacity': {lane: total > capacity_m + 1e-9 for lane, total in zip((1, 2, 3), plan.lane_totals)},
+        'fits': plan.quality['fits'],
+        'overflow_m': plan.quality['overflow_m'],
+        'split_lsa_groups': plan.quality['split_lsa_groups'],
+        'pallet_places': pallet_places,
+        'price': price,
+        'is_full': is_full,
+        'capacity_m': capacity_m,
+        'current': {
+            'lane_totals': {lane: round(total, 2) for lane, total in zip((1, 2, 3), current_totals)},
+            'pallet_places': current_places,
+            'price': current_price,
+        },
+    }
+
+@app.route('/simulate_lanes/<int:order_id>', methods=['POST'])
+def simulate_lanes(order_id):
+    """Read-only simulace lanes pro hypotetické přidání/odebrání palet (nic se neukládá)"""
+    data = request.get_json(silent=True) or {}
+    add_items, remove_items = data.get('add_items', []), data.get('remove_items', [])
+    if not isinstance(add_items, list) or not isinstance(remove_items, list):
+        return jsonify({'success': False, 'error': 'add_items a remove_items musí být seznamy ID palet'}), 400
+    try:
+        add_item_ids = [int(item_id) for item_id in add_items]
+        remove_item_ids = [int(item_id) for item_id in remove_items]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Neplatná ID palet'}), 400
+    remove_lsa = data.get('remove_lsa', [])
+    if not isinstance(remove_lsa, list) or not all(isinstance(lsa, str) for lsa in remove_lsa):
+        return jsonify({'success': False, 'error': 'remove_lsa musí být seznam kódů LSA'}), 400
+    strategy = data.get('strategy')
+    if strategy is not None and strategy in LANE_STRATEGIES and LANE_STRATEGIES[strategy]['time_budget']:
+        return jsonify({'success': False, 'error': 'Přesnou optimalizaci nelze použít v simulaci, použijte /optimize_lanes'}), 400
+    result = simulate_lane_assignment(order_id, add_item_ids, remove_item_ids, remove_lsa, strategy)
+    if result is None:
+        return jsonify({'success': False, 'error': 'Zakázka neexistuje'}), 404
+    return jsonify({'success': True, 'simulation': result})
+
 @app.route('/test_email')
 def test_email():
     """Testovací endpoint pro ověření SMTP nastavení"""
@@ -1584,16 +4496,19 @@ def print_loading_sheet(order_id):
         flash('Tiskový výstup je dostupný pouze pro uzavřené zakázky', 'warning')
         return redirect(url_for('order_view', order_id=order_id))
     
-    # Vygenerujeme LSA summary pro tisk
-    lsa_summary = generate_lsa_summary(order)
-    
-    # Aktuální čas pro footer
-    current_time = datetime.now().strftime('%d.%m.%Y %H:%M')
+    # Čas tisku v patičce doplňuje prohlížeč, ETag závisí jen na stavu zakázky
+    etag = order_etag(order, 'print_loading_sheet')
+    not_modified = order_not_modified(etag)
+    if not_modified:
+        return not_modified
     
-    return render_template('print_loading_sheet.html', 
-                         order=order, 
-                         lsa_summary=lsa_summary,
-                         current_time=current_time)
+    def render():
+        # Vygenerujeme LSA summary pro tisk
+        lsa_summary = generate_lsa_summary(order)
+        return render_template('print_loading_sheet.html', 
+                             order=order, 
+                             lsa_summary=lsa_summary)
+    return order_conditional(cached_order_render(order, etag, render), etag)
 
 @app.route('/reopen_order/<int:order_id>', methods=['POST'])
 def reopen_order(order_id):
@@ -1729,6 +4644,10 @@ def get_loading_status(order_id):
     """Získání statistik načítání pro konkrétní zakázku"""
     try:
         order = Order.query.get_or_404(order_id)
+        etag = order_etag(order, 'get_loading_status')
+        not_modified = order_not_modified(etag)
+        if not_modified:
+            return not_modified
         
         # Seskupení podle LSA
         lsa_status = {}
@@ -1755,7 +4674,7 @@ def get_loading_status(order_id):
         loaded_pallets = sum(status['loaded'] for status in lsa_status.values())
         overall_percentage = round((loaded_pallets / total_pallets) * 100, 1) if total_pallets > 0 else 0
         
-        return jsonify({
+        return order_conditional(jsonify({
             'success': True,
             'lsa_status': lsa_status,
             'overall': {
@@ -1763,7 +4682,7 @@ def get_loading_status(order_id):
                 'loaded': loaded_pallets,
                 'percentage': overall_percentage
             }
-        })
+        }), etag)
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Chyba při načítání statistik: {str(e)}'})
@@ -1874,8 +4793,10 @@ def restore_database():
         # Vymazání stávajících dat
         PalletItem.query.delete()
         ImportedFile.query.delete()
+        ImportJob.query.delete()
         Order.query.delete()
         db.session.commit()
+        ORDER_RENDER_CACHE.clear()
         
         # Import zakázek
         order_id_mapping = {}  # Mapování starých ID na nová
@@ -1960,6 +4881,10 @@ if __name__ == '__main__':
 try:
     with app.app_context():
         init_db()
+        # Podprocesy importního poolu (spawn) nesmí převzít importy na pozadí
+        if multiprocessing.parent_process() is None:
+            resume_import_jobs()
+            resume_reoptimize_jobs()
     print("Database initialized successfully for WSGI!")
 except Exception as e:
     print(f"Database initialization error: {e}")
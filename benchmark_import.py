@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark importu palet z Excelu.
+
+Dva režimy:
+- porovnání čtení: původní cesta přes pandas vs. streamované čtení přes
+  openpyxl (read-only, values-only), včetně peak RSS
+- sada fází: syntetické sešity 100 až 1M řádků, měří se jednotlivé fáze
+  upload() (čtení, převod sloupců, rozbalení qty, insert, auto-assign,
+  vykreslení zakázky) a výsledky se ukládají do JSON pro porovnání mezi commity
+
+Každé měření běží ve vlastním podprocesu (vlastní peak RSS, vlastní
+dočasná databáze přes DATABASE_URL - hueppe.db se nepoužívá).
+
+Použití:
+    python benchmark_import.py [počet_řádků ...]
+    python benchmark_import.py --suite [počet_řádků ...] [--max-qty 3] [--missing-ratio 0.3] [--group-size 3 12] [--output soubor.json]
+    python benchmark_import.py --compare stary.json novy.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+SUITE_SIZES = [100, 1000, 10000, 100000]
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+PALLET_TEXTS = [
+    'Standard EWP 80x230', 'Standard EWP 80x130', 'Gitterbox 80x120',
+    'Langgut 80x450', 'Sonderpalette 100x320', 'Kiste 80x180',
+]
+
+def generate_workbook(path, rows, seed=42, max_qty=3, missing_ratio=0.3, group_size=(3, 12)):
+    """Vygeneruje .xlsx ve formátu Hueppe (2 řádky hlavičky, data A-I od řádku 3).
+
+    max_qty        - qty ve sloupci E je 1..max_qty (převažuje 1)
+    missing_ratio  - podíl řádků bez délky v G/H/I (délka se dopočte z textu)
+    group_size     - rozsah počtu řádků jedné LSA skupiny
+    """
+    from openpyxl import Workbook
+
+    rnd = random.Random(seed)
+    qty_choices = [1] * max_qty + list(range(1, max_qty + 1))
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Palety')
+    ws.append(['Paletová přehled'])
+    ws.append(['Datum', 'Označení', 'LSA', 'Text', 'Počet', 'Váha', 'Délka 1', 'Délka 2', 'Délka 3'])
+    lsa = 500000
+    group_left = 0
+    for i in range(rows):
+        if group_left <= 0:
+            lsa += 1
+            group_left = rnd.randint(*group_size)
+        group_left -= 1
+        text = rnd.choice(PALLET_TEXTS)
+        length = int(text.rsplit('x', 1)[1]) / 100.0
+        lengths = [None, None, None]
+        if rnd.random() >= missing_ratio:
+            lengths[rnd.randint(0, 2)] = length
+        ws.append([
+            f'2025-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}',
+            rnd.choice(['CZEX', 'CZU', 'CZL']),
+            str(lsa),
+            text,
+            rnd.choice(qty_choices),
+            round(rnd.uniform(80, 900), 1),
+        ] + lengths)
+    wb.save(path)
+
+def run_pandas(path):
+    """Původní cesta z upload(): pd.read_excel + iterrows"""
+    import pandas as pd
+    from app import parse_length_from_text
+
+    df = pd.read_excel(path, header=None, engine='openpyxl')
+    df_sub = df.iloc[2:, 0:9].copy()
+    pallets = 0
+    for _, row in df_sub.iterrows():
+        try:
+            str(row[0]).strip() if not pd.isna(row[0]) else ''
+            str(row[1]).strip() if not pd.isna(row[1]) else ''
+            str(row[2]).strip() if not pd.isna(row[2]) else ''
+            pallet_text = str(row[3]).strip() if not pd.isna(row[3]) else ''
+            qty = int(row[4]) if not pd.isna(row[4]) else 1
+            float(row[5]) if not pd.isna(row[5]) else 0.0
+            lengths = [
+                float(row[c]) if not pd.isna(row[c]) and str(row[c]).replace('.', '').replace(',', '').isdigit() else 0.0
+                for c in (6, 7, 8)
+            ]
+            if not any(length > 0 for length in lengths):
+                parse_length_from_text(pallet_text)
+        except Exception:
+            continue
+        pallets += max(1, qty)
+    return df_sub.shape[0], pallets
+
+def run_streaming(path):
+    """Nová cesta: iter_pallet_rows (openpyxl read-only)"""
+    from app import iter_pallet_rows
+
+    rows = 0
+    pallets = 0
+    with open(path, 'rb') as f:
+        for row in iter_pallet_rows(f):
+            rows += 1
+            pallets += max(1, row['qty'])
+    return rows, pallets
+
+def run_batch(path):
+    """Streaming + sloupcové zpracování a rozbalení podle qty (build_pallet_batch)"""
+    from app import iter_excel_rows, build_pallet_batch
+
+    with open(path, 'rb') as f:
+        batch = build_pallet_batch(iter_excel_rows(f))
+    return batch.source_rows, len(batch)
+
+VARIANTS = {
+    'pandas': run_pandas,
+    'streaming': run_streaming,
+    'batch': run_batch,
+}
+
+def measure(variant, path):
+    """Spustí variantu v tomto procesu a vrátí čas, počty a peak RSS"""
+    # Importy (app, pandas) proběhnou mimo měřený čas, do peak RSS se ale započítají
+    import app  # noqa: F401
+    if variant == 'pandas':
+        import pandas  # noqa: F401
+    start = time.perf_counter()
+    rows, pallets = VARIANTS[variant](path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'variant': variant,
+        'rows': rows,
+        'pallets': pallets,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'peak_rss_mb': round(peak_kb / 1024.0, 1),
+    }
+
+def run_in_subprocess(variant, path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.splitext(path)[0] + '.db')
+    out = subprocess.run(
+        [sys.executable, __file__, '--measure', variant, path],
+        capture_output=True, text=True, check=True, cwd=BASE_DIR, env=env
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(sizes):
+    print("📊 Benchmark importu Excelu (pandas vs. streaming)")
+    print("=" * 72)
+    print(f"{'řádků':>8} | {'varianta':<10} | {'čas (s)':>8} | {'řádků/s':>10} | {'peak RSS (MB)':>13}")
+    print("-" * 72)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f'bench_{size}.xlsx')
+            generate_workbook(path, size)
+            for variant in VARIANTS:
+                result = run_in_subprocess(variant, path)
+                print(f"{size:>8} | {variant:<10} | {result['seconds']:>8.3f} | "
+                      f"{result['rows_per_sec']:>10.1f} | {result['peak_rss_mb']:>13.1f}")
+
+# Sada fází upload()
+SUITE_PHASES = ['read', 'parse', 'qty_expansion', 'insert', 'auto_assign', 'render']
+
+def run_suite_phases(path):
+    """Změří fáze upload() nad jedním sešitem (v podprocesu s dočasnou DB)"""
+    import app as hueppe
+
+    timings = {}
+    with hueppe.app.app_context():
+        order = hueppe.Order(name='benchmark')
+        hueppe.db.session.add(order)
+        hueppe.db.session.commit()
+        order_id = order.id
+
+        start = time.perf_counter()
+        with hueppe.open_spooled(path) as f:
+            raw_rows = list(hueppe.iter_excel_rows(f))
+        timings['read'] = time.perf_counter() - start
+
+        chunks = [raw_rows[i:i + hueppe.IMPORT_CHUNK_ROWS] for i in range(0, len(raw_rows), hueppe.IMPORT_CHUNK_ROWS)]
+        start = time.perf_counter()
+        coerced = [hueppe.coerce_rows(chunk) for chunk in chunks]
+        timings['parse'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = hueppe.PalletBatch.concat([hueppe.expand_by_qty(part) for part in coerced])
+        timings['qty_expansion'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pallets = hueppe.bulk_insert_pallets(order_id, batch)
+        hueppe.db.session.commit()
+        timings['insert'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hueppe.auto_assign_lanes(order_id)
+        timings['auto_assign'] = time.perf_counter() - start
+        hueppe.db.session.remove()
+
+    # Stránka zakázky, na kterou upload() přesměruje
+    client = hueppe.app.test_client()
+    start = time.perf_counter()
+    response = client.get(f'/order/{order_id}')
+    timings['render'] = time.perf_counter() - start
+
+    return {
+        'rows': len(raw_rows),
+        'pallets': pallets,
+        'render_bytes': len(response.data),
+        'phases': {phase: round(timings[phase], 4) for phase in SUITE_PHASES},
+        'total': round(sum(timings.values()), 4),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=BASE_DIR)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(sizes, max_qty, missing_ratio, group_size, output):
+    commit = git_commit()
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {'max_qty': max_qty, 'missing_ratio': missing_ratio, 'group_size': list(group_size)},
+        'results': [],
+    }
+    print(f"📊 Sada fází importu (commit {commit or '?'})")
+    header = f"{'řádků':>8} | {'palet':>8} | " + " | ".join(f"{phase:>13}" for phase in SUITE_PHASES) + f" | {'celkem':>8}"
+    print(header)
+    print("-" * len(header))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f'suite_{size}.xlsx')
+            generate_workbook(path, size, max_qty=max_qty, missing_ratio=missing_ratio, group_size=group_size)
+            env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, f'suite_{size}.db'))
+            out = subprocess.run(
+                [sys.executable, __file__, '--run-suite', path],
+                capture_output=True, text=True, check=True, cwd=BASE_DIR, env=env
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            report['results'].append(result)
+            print(f"{result['rows']:>8} | {result['pallets']:>8} | "
+                  + " | ".join(f"{result['phases'][phase]:>13.4f}" for phase in SUITE_PHASES)
+                  + f" | {result['total']:>8.3f}")
+
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'local'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Výsledky uloženy do {output}")
+
+def compare_reports(old_path, new_path):
+    """Porovná dva JSON výsledky sady fází (změna času po fázích v %)"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    old_by_rows = {result['rows']: result for result in old['results']}
+    print(f"📊 Porovnání {old.get('commit') or old_path} -> {new.get('commit') or new_path}")
+    for result in new['results']:
+        before = old_by_rows.get(result['rows'])
+        if not before:
+            continue
+        print(f"\n{result['rows']} řádků:")
+        for phase in SUITE_PHASES + ['total']:
+            a = before['phases'].get(phase) if phase != 'total' else before['total']
+            b = result['phases'].get(phase) if phase != 'total' else result['total']
+            if a is None or b is None:
+                continue
+            change = ((b - a) / a * 100.0) if a else 0.0
+            marker = '🔴' if change > 10 else '🟢' if change < -10 else '  '
+            print(f"  {marker} {phase:<14} {a:>9.4f} s -> {b:>9.4f} s ({change:+.1f} %)")
+
+def quiet(func, *args):
+    # Potlačíme výpisy z inicializace app, na stdout musí jít jen JSON
+    devnull = open(os.devnull, 'w')
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        return func(*args)
+    finally:
+        sys.stdout = real_stdout
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--measure':
+        print(json.dumps(quiet(measure, sys.argv[2], sys.argv[3])))
+    elif len(sys.argv) > 1 and sys.argv[1] == '--run-suite':
+        print(json.dumps(quiet(run_suite_phases, sys.argv[2])))
+    else:
+        parser = argparse.ArgumentParser(description='Benchmark importu palet')
+        parser.add_argument('sizes', nargs='*', type=int, help='počty řádků sešitu')
+        parser.add_argument('--suite', action='store_true', help='měřit jednotlivé fáze upload()')
+        parser.add_argument('--max-qty', type=int, default=3)
+        parser.add_argument('--missing-ratio', type=float, default=0.3)
+        parser.add_argument('--group-size', type=int, nargs=2, default=(3, 12), metavar=('MIN', 'MAX'))
+        parser.add_argument('--output', help='cesta k JSON výsledkům (výchozí benchmark_results/)')
+        parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='porovnat dva JSON výsledky')
+        args = parser.parse_args()
+
+        if args.compare:
+            compare_reports(*args.compare)
+        elif args.suite:
+            run_suite(args.sizes or SUITE_SIZES, args.max_qty, args.missing_ratio, tuple(args.group_size), args.output)
+        else:
+            main(args.sizes or DEFAULT_SIZES)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Porovnání strategií přiřazení lanes (registr LANE_STRATEGIES v app.py).
+
+Každá strategie se spustí na reálných zakázkách z databáze (jen čtení,
+nic se nezapisuje) a na syntetických zakázkách. Pro každou strategii se
+vypíše přetečení nad kapacitu lane, rozptyl lanes, počet rozdělených LSA,
+počet zakázek, které se nevešly, a doba výpočtu.
+
+Databáze se bere z DATABASE_URL, jinak hueppe.db vedle aplikace.
+
+Použití:
+    python benchmark_lanes.py [--strategies balanced exact ...] [--synthetic 200] [--pallets 8 24] [--no-db] [--time-budget 0.5] [--output soubor.json]
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+PALLET_LENGTHS = [0.8, 1.2, 1.3, 1.8, 2.3, 3.2, 4.5]
+
+def synthetic_orders(count, pallets_range=(8, 24), seed=42, capacity_m=13.6):
+    """Syntetické zakázky - LSA skupiny po 1-5 paletách, délky podle běžných typů palet"""
+    from app import LaneArrays
+    rnd = random.Random(seed)
+    orders = []
+    for number in range(count):
+        pallets = []
+        lsa = 0
+        for _ in range(rnd.randint(*pallets_range)):
+            if not pallets or rnd.random() < 0.35:
+                lsa += 1
+            pallets.append((f'LSA-{lsa}', rnd.choice(PALLET_LENGTHS)))
+        orders.append((f'synthetic #{number + 1}', LaneArrays.from_pallets(pallets), capacity_m))
+    return orders
+
+def database_orders():
+    """Reálné zakázky s paletami (jen čtení)"""
+    from app import app, Order, LaneArrays, DEFAULT_LANE_CAPACITY
+    orders = []
+    with app.app_context():
+        for order in Order.query.order_by(Order.id).all():
+            arrays = LaneArrays.load(order.id)
+            if len(arrays):
+                orders.append((f'#{order.id} {order.name}', arrays, order.capacity_m or DEFAULT_LANE_CAPACITY))
+    return orders
+
+def compare_strategies(orders, strategies, time_budget_s=None):
+    """Spustí všechny strategie na všech zakázkách a vrátí souhrn po strategiích"""
+    from app import run_lane_strategy
+    summary = {}
+    for name in strategies:
+        totals = {'orders': 0, 'overflow_m': 0.0, 'max_overflow_m': 0.0, 'not_fitting': 0,
+                  'spread_m': 0.0, 'split_lsa_groups': 0, 'runtime_s': 0.0, 'max_runtime_s': 0.0, 'proven_optimal': 0}
+        for _, arrays, capacity_m in orders:
+            plan = run_lane_strategy(name, arrays, int(round(capacity_m * 100)), time_budget_s)
+            quality = plan.quality
+            totals['orders'] += 1
+            totals['overflow_m'] += quality['overflow_m']
+            totals['max_overflow_m'] = max(totals['max_overflow_m'], quality['overflow_m'])
+            totals['not_fitting'] += 0 if quality['fits'] else 1
+            totals['spread_m'] += quality['spread_m']
+            totals['split_lsa_groups'] += quality['split_lsa_groups']
+            totals['runtime_s'] += plan.elapsed_s
+            totals['max_runtime_s'] = max(totals['max_runtime_s'], plan.elapsed_s)
+            totals['proven_optimal'] += 1 if plan.optimal else 0
+        count = totals['orders'] or 1
+        summary[name] = {
+            'orders': totals['orders'],
+            'not_fitting': totals['not_fitting'],
+            'overflow_m': round(totals['overflow_m'], 2),
+            'max_overflow_m': round(totals['max_overflow_m'], 2),
+            'avg_spread_m': round(totals['spread_m'] / count, 3),
+            'split_lsa_groups': totals['split_lsa_groups'],
+            'avg_runtime_ms': round(totals['runtime_s'] / count * 1000, 3),
+            'max_runtime_ms': round(totals['max_runtime_s'] * 1000, 3),
+            'proven_optimal': totals['proven_optimal'],
+        }
+    return summary
+
+def print_summary(title, summary):
+    print(f"\n📊 {title}")
+    header = f"{'strategie':<14} | {'zakázek':>7} | {'nevejde':>7} | {'přesah m':>9} | {'max přesah':>10} | {'rozptyl m':>9} | {'dělené LSA':>10} | {'ms/zak.':>9} | {'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, row in summary.items():
+        print(f"{name:<14} | {row['orders']:>7} | {row['not_fitting']:>7} | {row['overflow_m']:>9.2f} | {row['max_overflow_m']:>10.2f} | "
+              f"{row['avg_spread_m']:>9.3f} | {row['split_lsa_groups']:>10} | {row['avg_runtime_ms']:>9.3f} | {row['max_runtime_ms']:>9.3f}")
+
+def main(strategies=None, synthetic=200, pallets_range=(8, 24), use_db=True, time_budget_s=None, output=None):
+    import app as hueppe
+    strategies = strategies or list(hueppe.LANE_STRATEGIES)
+    unknown = [name for name in strategies if name not in hueppe.LANE_STRATEGIES]
+    if unknown:
+        sys.exit(f"Neznámé strategie: {', '.join(unknown)} (dostupné: {', '.join(hueppe.LANE_STRATEGIES)})")
+
+    report = {'created_at': datetime.now().isoformat(timespec='seconds'), 'strategies': strategies, 'results': {}}
+    if use_db:
+        orders = database_orders()
+        if orders:
+            report['results']['database'] = compare_strategies(orders, strategies, time_budget_s)
+            print_summary(f"Zakázky z databáze ({len(orders)})", report['results']['database'])
+        else:
+            print("\nV databázi nejsou žádné zakázky s paletami")
+    if synthetic:
+        orders = synthetic_orders(synthetic, pallets_range)
+        report['results']['synthetic'] = compare_strategies(orders, strategies, time_budget_s)
+        print_summary(f"Syntetické zakázky ({synthetic}, {pallets_range[0]}-{pallets_range[1]} palet)", report['results']['synthetic'])
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Výsledky uloženy do {output}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Porovnání strategií přiřazení lanes')
+    parser.add_argument('--strategies', nargs='+', help='názvy strategií (výchozí všechny)')
+    parser.add_argument('--synthetic', type=int, default=200, help='počet syntetických zakázek (0 = žádné)')
+    parser.add_argument('--pallets', type=int, nargs=2, default=(8, 24), metavar=('MIN', 'MAX'), help='rozsah palet syntetické zakázky')
+    parser.add_argument('--no-db', action='store_true', help='nepoužívat zakázky z databáze')
+    parser.add_argument('--time-budget', type=float, help='časový limit strategií, které ho podporují (s)')
+    parser.add_argument('--output', help='uložit výsledky do JSON')
+    args = parser.parse_args()
+    main(args.strategies, args.synthetic, tuple(args.pallets), not args.no_db, args.time_budget, args.output)
@@ -5,7 +5,7 @@ Script pro správu zakázek - zobrazení a mazání
 
 import sys
 sys.path.append('.')
-from app import app, db, Order, PalletItem, ImportedFile
+from app import app, db, Order, PalletItem, ImportedFile, rebuild_order_aggregates
 
 def list_orders():
     """Zobrazí všechny zakázky"""
@@ -14,8 +14,7 @@ def list_orders():
         print("📋 Dostupné zakázky:")
         print("-" * 50)
         for order in orders:
-            items_count = len(order.items)
-            print(f"ID: {order.id:2d} | Název: '{order.name}' | Palety: {items_count}")
+            print(f"ID: {order.id:2d} | Název: '{order.name}' | Palety: {order.pallet_count or 0}")
         return orders
 
 def delete_order(order_id):
@@ -41,10 +40,20 @@ def delete_order(order_id):
         print(f"✅ Zakázka '{order_name}' (ID: {order_id}) byla smazána!")
         return True
 
+def rebuild_aggregates():
+    """Přepočítá souhrny palet (počty, lanes, váha) uložené u zakázek"""
+    with app.app_context():
+        count = rebuild_order_aggregates()
+        print(f"✅ Souhrny přepočítány pro {count} zakázek")
+
 if __name__ == "__main__":
     print("🛠️  Správa zakázek")
     print("=" * 30)
     
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-aggregates":
+        rebuild_aggregates()
+        sys.exit(0)
+    
     orders = list_orders()
     
     if len(sys.argv) > 1 and sys.argv[1] == "delete":
@@ -58,4 +67,6 @@ if __name__ == "__main__":
             print("❌ Použití: python manage_orders.py delete <order_id>")
     else:
         print("\n💡 Pro smazání zakázky použij:")
-        print("   python manage_orders.py delete <order_id>")
\ No newline at end of file
+        print("   python manage_orders.py delete <order_id>")
+        print("💡 Přepočet souhrnů zakázek (počty palet, lanes, váha):")
+        print("   python manage_orders.py rebuild-aggregates")
\ No newline at end of file